@@ -0,0 +1,152 @@
+# src/analytics.py
+import numpy as np
+import pandas as pd
+
+from ant import COLUMNS, NUMERIC_COLUMNS
+
+# Номинальный хешрейт моделей, GH/s; более точные названия должны идти раньше общих
+MODEL_NOMINAL = (
+    ("S21 Pro", 234000),
+    ("S21", 200000),
+    ("S19 XP", 140000),
+    ("S19k Pro", 120000),
+    ("S19j Pro+", 122000),
+    ("S19j Pro", 100000),
+    ("S19 Pro", 110000),
+    ("S19j", 90000),
+    ("S19", 95000),
+    ("T19", 84000),
+    ("S17 Pro", 53000),
+    ("S17", 56000),
+    ("T17", 40000),
+    ("S9", 13500),
+)
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+def to_frame(df):
+    """Приводим столбцы к типам: числовые — float64, строковые — категории."""
+    for col in NUMERIC_COLUMNS:
+        if col in df:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    for col in ("Type", "miner_version", "Pool", "User", "container"):
+        if col in df:
+            df[col] = df[col].astype("category")
+    return df
+
+def load_sweep(rows, container_of=None):
+    """Загружаем результаты сканирования (строки build_values) в DataFrame.
+
+    container_of — словарь {ip: контейнер} или функция IP -> контейнер.
+    """
+    df = pd.DataFrame(list(rows), columns=list(COLUMNS))
+    df["container"] = df["IP"].map(container_of or {})
+    return to_frame(df)
+
+def ip_to_str(ips):
+    """Преобразуем массив IP-адресов в числовом виде в строки без цикла по строкам."""
+    ips = np.asarray(ips, dtype=np.int64)
+    octets = [pd.Series((ips >> shift) & 255).astype(str) for shift in (24, 16, 8, 0)]
+    return octets[0] + "." + octets[1] + "." + octets[2] + "." + octets[3]
+
+def load_history(store, start, end, resolution="auto", aggregate="mean"):
+    """Загружаем окно истории в DataFrame: одна строка на аппарат (aggregate: mean, last, min)."""
+    rows = store.window(start, end, resolution)
+    df = pd.DataFrame(rows, columns=["ip", "ts", "container", "Type", "GHS av", "GHS 5s", "total_freqavg", "Elapsed"])
+    if df.empty:
+        return to_frame(df.drop(columns=["ip", "ts"]).assign(IP=pd.Series(dtype="object")))
+    numeric = ["GHS av", "GHS 5s", "total_freqavg", "Elapsed"]
+    grouped = df.sort_values("ts").groupby("ip", sort=False)
+    if aggregate == "last":
+        result = grouped.last()
+    else:
+        result = grouped[numeric].agg(aggregate).join(grouped[["container", "Type"]].last())
+    result = result.reset_index()
+    result.insert(0, "IP", ip_to_str(result.pop("ip")).to_numpy())
+    return to_frame(result.drop(columns="ts", errors="ignore"))
+
+def nominal_hashrate(models):
+    """Номинальный хешрейт для столбца моделей (поиск выполняется один раз на уникальную модель)."""
+    models = pd.Series(models, dtype="object")
+    lookup = {}
+    for model in models.dropna().unique():
+        lookup[model] = next((value for name, value in MODEL_NOMINAL if name in str(model)), np.nan)
+    return models.map(lookup).astype("float64")
+
+def quantile_columns(grouped, column):
+    """Процентили столбца по группам в виде отдельных столбцов p5, p25, ..."""
+    q = grouped[column].quantile([p / 100 for p in PERCENTILES]).unstack()
+    q.columns = [f"p{p}" for p in PERCENTILES]
+    return q
+
+def summarize(df, by):
+    """Сводка по группам: число аппаратов, суммарный и средний хешрейт, процентили GHS 5s, частота."""
+    grouped = df.groupby(by, observed=True)
+    summary = grouped.agg(
+        miners=("IP", "count"),
+        ghs_total=("GHS av", "sum"),
+        ghs_mean=("GHS av", "mean"),
+        ghs_5s_total=("GHS 5s", "sum"),
+        freq_mean=("total_freqavg", "mean"),
+    )
+    return summary.join(quantile_columns(grouped, "GHS 5s")).sort_values("ghs_total", ascending=False)
+
+def container_summary(df):
+    """Сводка по контейнерам."""
+    return summarize(df, "container")
+
+def model_summary(df):
+    """Сводка по моделям с номинальным хешрейтом и средней долей от него."""
+    summary = summarize(df, "Type")
+    nominal = pd.Series(nominal_hashrate(summary.index).to_numpy(), index=summary.index)
+    summary["nominal"] = nominal
+    summary["efficiency"] = summary["ghs_mean"] / nominal
+    return summary
+
+def percentiles(df, column="GHS 5s", q=PERCENTILES):
+    """Процентили столбца по всей ферме."""
+    values = df[column].to_numpy(dtype="float64")
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return pd.Series(np.nan, index=[f"p{p}" for p in q])
+    return pd.Series(np.percentile(values, q), index=[f"p{p}" for p in q])
+
+def underperformers(df, threshold=0.9, column="GHS 5s"):
+    """Аппараты, выдающие меньше threshold от номинала модели.
+
+    Для моделей без известного номинала сравниваем с медианой модели по ферме.
+    """
+    nominal = nominal_hashrate(df["Type"]).to_numpy()
+    median = df.groupby("Type", observed=True)[column].transform("median").to_numpy(dtype="float64")
+    reference = np.where(np.isnan(nominal), median, nominal)
+    actual = df[column].to_numpy(dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = actual / reference
+    mask = (ratio < threshold) | np.isnan(actual)
+    result = df.loc[mask].copy()
+    result["reference"] = reference[mask]
+    result["ratio"] = ratio[mask]
+    return result.sort_values("ratio", na_position="first")
+
+def pool_distribution(df):
+    """Распределение аппаратов и хешрейта по пулам и пользователям."""
+    grouped = df.groupby(["Pool", "User"], observed=True)
+    distribution = grouped.agg(miners=("IP", "count"), ghs_total=("GHS av", "sum"))
+    total = distribution["ghs_total"].sum()
+    distribution["share"] = distribution["ghs_total"] / total if total else np.nan
+    return distribution.sort_values("ghs_total", ascending=False)
+
+def fleet_report(df, threshold=0.9):
+    """Текстовый отчёт по ферме для показа в интерфейсе."""
+    parts = [
+        f"Аппаратов: {len(df)}, суммарно GHS av: {df['GHS av'].sum():.0f}",
+        "Процентили GHS 5s:\n" + percentiles(df).round(1).to_string(),
+        "По контейнерам:\n" + container_summary(df).round(1).to_string(),
+        "По моделям:\n" + model_summary(df).round(2).to_string(),
+    ]
+    if "Pool" in df:
+        parts.append("Пулы:\n" + pool_distribution(df).round(3).to_string())
+    weak = underperformers(df, threshold)
+    parts.append(f"Ниже {threshold:.0%} от номинала: {len(weak)}\n"
+                 + weak[["IP", "container", "Type", "GHS 5s", "reference", "ratio"]].head(50).round(2).to_string(index=False))
+    return "\n\n".join(parts)
@@ -1,86 +1,126 @@
 # src/ant.py
 import socket
-import json
 import threading
+import time
+
+from cgminer import PORT, BASE_COMMANDS, QUERY_ERRORS, CommandRejected, ResponseReader, build_request, fetch_plan, parse_replies
+from metrics import Metrics
+from timeouts import TimeoutPolicy
+
+# Столбцы таблицы в порядке значений, которые возвращает build_values
+COLUMNS = ("IP", "Type", "GHS av", "GHS 5s", "total_freqavg", "miner_version", "Pool", "User", "Elapsed")
+# Столбцы с числовыми значениями
+NUMERIC_COLUMNS = ("GHS av", "GHS 5s", "total_freqavg", "Elapsed")
+
+def parse_float(value):
+    """Преобразуем значение из ответа аппарата в число; None, если это невозможно."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def build_values(ip, stats, pools):
+    """Формируем строку таблицы из ответов stats и pools."""
+    stats_data = stats.get("STATS", [{}])
+    pools_data = pools.get("POOLS", [{}])
+
+    stat = stats_data[0] if len(stats_data) > 0 else {}
+    stat_s = stats_data[1] if len(stats_data) > 1 else {}
+    pool_one = pools_data[0] if len(pools_data) > 0 else {}
+    pool_two = pools_data[1] if len(pools_data) > 1 else {}
+
+    return [
+        ip,
+        stat.get("Type", ""),
+        stat_s.get("GHS av", ""),
+        stat_s.get("GHS 5s", ""),
+        stat_s.get("total_freqavg", ""),
+        stat_s.get("miner_version", ""),
+        pool_one.get("URL", ""),
+        pool_two.get("User", ""),
+        stat_s.get("Elapsed", "")
+    ]
 
 class Ant:
-    def __init__(self):
-        self.scanned_data = {}
-        self.scanned_data_lock = threading.Lock()
+    def __init__(self, extra_commands=(), timeouts=None, metrics=None):
+        self.commands = BASE_COMMANDS + tuple(extra_commands)  # например, ("summary", "devs")
+        self.multi_unsupported = set()  # IP аппаратов, прошивка которых не принимает "stats+pools"
+        self.multi_unsupported_lock = threading.Lock()
+        self.errors = {}  # IP -> последняя ошибка опроса
+        self.timeouts = timeouts or TimeoutPolicy()
+        self.metrics = metrics or Metrics()
 
     def scan_miner(self, ip):
         """Сканируем аппарат, запрашивая его статистику и пулы."""
-        self.scan_command(ip, "stats")
-        self.scan_command(ip, "pools")
-
-    def scan_command(self, ip, command):
-        """Отправляем команду на аппарат и получаем ответ."""
+        ip = ip.strip()
+        replies = self.fetch(ip, self.commands)
+        if replies is None:
+            return
+        if all(command in replies for command in BASE_COMMANDS):
+            self.update_tree(ip, replies)
+
+    def fetch(self, ip, commands):
+        """Запрашиваем несколько команд за одно соединение, при отказе прошивки — по отдельности."""
+        with self.multi_unsupported_lock:
+            multi = ip not in self.multi_unsupported
+        plan = fetch_plan(commands, multi)
         try:
-            HOST = ip.strip()
-            PORT = 4028
-
-            m = {"command": command}
-            jdata = json.dumps(m)
-
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(2)
-                s.connect((HOST, PORT))
-                s.sendall(bytes(jdata, encoding="utf-8"))
-                data = ''
-                while True:
-                    chunk = s.recv(4026)
-                    if not chunk:
-                        break
-                    data += chunk.decode("utf-8")
-
-                datajs = json.loads(data[:-1])
-
-                if command == "stats":
-                    self.update_data(HOST, stats=datajs)
-                elif command == "pools":
-                    self.update_data(HOST, pools=datajs)
-
-        except Exception:
-            pass
+            request = next(plan)
+            while True:
+                try:
+                    result = self.scan_command(ip, request)
+                except QUERY_ERRORS as exc:
+                    result = exc
+                    if isinstance(exc, CommandRejected) and isinstance(request, tuple):
+                        with self.multi_unsupported_lock:
+                            self.multi_unsupported.add(ip)
+                try:
+                    request = plan.send(result)
+                except StopIteration as stop:
+                    replies, errors = stop.value
+                    break
+        except QUERY_ERRORS as exc:
+            self.errors[ip] = exc
+            self.metrics.record_error(ip, exc)
+            return None
+        for exc in errors:
+            self.metrics.record_error(ip, exc, counted=False)
+        self.errors.pop(ip, None)
+        self.metrics.polled(ip, replies)
+        return replies
 
-    def update_data(self, ip, stats=None, pools=None):
-        """Обновляем данные об аппарате и вызываем обновление в интерфейсе."""
-        with self.scanned_data_lock:
-            if ip not in self.scanned_data:
-                self.scanned_data[ip] = {"stats": None, "pools": None}
-
-            if stats:
-                self.scanned_data[ip]["stats"] = stats
-            if pools:
-                self.scanned_data[ip]["pools"] = pools
-
-            if self.scanned_data[ip]["stats"] and self.scanned_data[ip]["pools"]:
-                self.update_tree(ip, self.scanned_data[ip])
-                del self.scanned_data[ip]
+    def scan_command(self, ip, command):
+        """Отправляем команду на аппарат и получаем ответ.
+
+        Возвращаем {команда: ответ}; временные ошибки повторяются по политике
+        таймаутов, остальные сетевые ошибки и ошибки разбора не глушатся.
+        """
+        return self.timeouts.call_sync(ip, lambda attempt: self.query_once(ip, command, attempt),
+                                       lambda exc: self.metrics.record_error(ip, exc, counted=False))
+
+    def query_once(self, ip, command, attempt=0):
+        """Одна попытка запроса с таймаутами по задержкам подсети."""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(self.timeouts.connect_timeout(ip, attempt))
+            started = time.monotonic()
+            s.connect((ip.strip(), PORT))
+            connected = time.monotonic()
+            self.timeouts.record_connect(ip, connected - started)
+            self.metrics.observe("miner_connect_seconds", ip, connected - started)
+            s.settimeout(self.timeouts.response_timeout(ip, attempt))
+            s.sendall(build_request(command))
+            reader = ResponseReader().read_socket(s)
+        received = time.monotonic()
+        self.metrics.observe("miner_response_seconds", ip, received - connected)
+        self.metrics.observe("miner_response_bytes", ip, reader.length)
+        replies = parse_replies(reader, command)
+        self.metrics.observe("miner_parse_seconds", ip, time.monotonic() - received)
+        self.timeouts.record_response(ip, received - connected)
+        return replies
 
     def update_tree(self, ip, data):
         """Формируем данные для отображения и вызываем callback для обновления интерфейса."""
-        stats_data = data["stats"].get("STATS", [{}])
-        pools_data = data["pools"].get("POOLS", [{}])
-
-        stat = stats_data[0] if len(stats_data) > 0 else {}
-        stat_s = stats_data[1] if len(stats_data) > 0 else {}
-        pool_one = pools_data[0] if len(pools_data) > 0 else {}
-        pool_two = pools_data[1] if len(pools_data) > 0 else {}
-        pool_three = pools_data[2] if len(pools_data) > 0 else {}
-
-        values = [
-            ip,
-            stat.get("Type", ""),
-            stat_s.get("GHS av", ""),
-            stat_s.get("GHS 5s", ""),
-            stat_s.get("total_freqavg", ""),
-            stat_s.get("miner_version", ""),
-            pool_one.get("URL", ""),
-            pool_two.get("User", ""),
-            stat_s.get("Elapsed", "")
-        ]
-
+        values = build_values(ip, data["stats"], data["pools"])
         self.update_tree_callback(ip, values)
 
     def set_update_tree_callback(self, callback):
@@ -2,22 +2,57 @@
 
 import tkinter as tk
 from tkinter import messagebox, filedialog
-import csv
-import pandas as pd
+import queue
+import time
 from ui import UI
-from ping import ping_mikrotik
-from data import load_containers, save_containers
-from ant import Ant
-from ipaddress import ip_network, ip_address
+from ping import check_containers
+from data import ConfigStore
+from ant import COLUMNS
+from scanner import AsyncScanner
+from pipeline import ResultQueue
+from monitor import Monitor
+from history import HistoryStore
+from discovery import DiscoveryCache
+from export import HISTORY_COLUMNS, ExportError, ExportJob, history_rows, typed_rows
+from analytics import load_sweep, load_history, fleet_report
+from iprange import ContainerRanges, IpRange, RangeSpecError, compile_container
+from timeouts import TimeoutPolicy
+from metrics import Metrics, MetricsServer
 
 class App:
     def __init__(self, root):
         self.root = root
-        self.ant = Ant()
+        self.container_ranges = ContainerRanges()  # скомпилированные диапазоны контейнеров
+        # Задержки собираются по подсетям и контейнерам, общие для сканирования и мониторинга
+        self.timeouts = TimeoutPolicy(container_of=self.container_ranges.container_of)
+        self.metrics = Metrics(container_of=self.container_ranges.container_of)
+        self.scanner = AsyncScanner(concurrency=512, timeouts=self.timeouts, metrics=self.metrics)
+        self.metrics_server = None
+        self.results = ResultQueue()
+        self.scan_thread = None
+        self.scan_stop_event = None
+        self.scan_container_ranges = {}
+        self.scanned_ips = IpRange()
+        self.found_ips = set()
+        self.polling = False
+        self.ip_containers = None  # IP -> контейнер для мониторинга, собирается по требованию
+        self.range_errors = {}  # уже показанные ошибки в диапазонах контейнеров
+        self.alerts = queue.SimpleQueue()
+        self.gateway_statuses = queue.SimpleQueue()
+        self.history = HistoryStore()
+        self.discovery = DiscoveryCache()
+        self.export_job = None
+        self.monitor = Monitor(self.scanner, self.monitor_targets, self.results.put_async,
+                               on_alert=lambda ip, container, reason: self.alerts.put((ip, container, reason)))
         self.setup_callbacks()  # Настраиваем callback-функции перед инициализацией UI
         self.initialize_ui()  # Инициализируем UI после настройки callback-функций
-        self.containers = load_containers()
+        self.config = ConfigStore()
+        self.containers = self.config.load()
+        self.update_ip_containers()
         self.update_container_listbox()
+        self.start_metrics_server()
+        self.root.after(2000, self.check_config)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def setup_callbacks(self):
         """Настройка callback-функций для UI."""
@@ -32,10 +67,15 @@ class App:
             'show_context_menu': self.show_context_menu,
             'export_to_csv': self.export_to_csv,
             'export_to_xlsx': self.export_to_xlsx,
+            'export_to_parquet': self.export_to_parquet,
+            'export_history': self.export_history,
+            'show_analytics': self.show_analytics,
+            'show_history_analytics': self.show_history_analytics,
+            'show_scan_metrics': self.show_scan_metrics,
+            'start_monitoring': self.start_monitoring,
+            'stop_monitoring': self.stop_monitoring,
             'show_info': self.show_info
         }
-        if hasattr(self, 'ui') and self.ui:
-            self.ant.set_update_tree_callback(self.ui.update_tree)
 
     def initialize_ui(self):
         """Инициализация UI."""
@@ -48,11 +88,18 @@ class App:
     def save_container(self, container_name, ip_ranges, mikrotik_ip):
         """Сохраняем данные о новом контейнере."""
         if container_name and ip_ranges:
-            self.containers[container_name] = {
-                'ip_ranges': [ip.strip() for ip in ip_ranges.split(',')],
+            specs = [ip.strip() for ip in ip_ranges.split(',') if ip.strip()]
+            try:
+                compile_container(specs)  # исключения ('!') действуют на все диапазоны контейнера
+            except RangeSpecError as exc:
+                messagebox.showwarning("Ошибка", f"Неверный диапазон: {exc}")
+                return
+            # Пишем поверх актуального файла: контейнеры, добавленные другим экземпляром, не теряются
+            self.containers = self.config.set_container(container_name, {
+                'ip_ranges': specs,
                 'mikrotik_ip': mikrotik_ip
-            }
-            save_containers(self.containers)
+            })
+            self.update_ip_containers()
             self.update_container_listbox()
             self.ui.update_container_status(container_name, "")
         else:
@@ -68,60 +115,162 @@ class App:
         """Сканируем выбранные контейнеры."""
         selected_containers = [self.ui.container_listbox.get(idx) for idx in self.ui.container_listbox.curselection()]
         print(f"Сканирование запущено\nВыбранные контейнеры: {selected_containers}")
+        container_ranges = {}
+        self.scanned_ips = IpRange()
+        self.found_ips = set()
         for container_name in selected_containers:
-            container_data = self.containers.get(container_name, {})
-            ip_ranges = container_data.get('ip_ranges', [])
-            mikrotik_ip = container_data.get('mikrotik_ip', None)
-
-            # Пингуем IP Mikrotik
-            print(f"Пинг Mikrotik: {mikrotik_ip} для контейнера {container_name}")
-            ping_mikrotik(mikrotik_ip, container_name, self.ui.update_container_status)
-
-            # Запускаем сканирование по IP-диапазонам
-            for ip_range in ip_ranges:
-                expanded_ips = self.expand_ip_range(ip_range)
-                print(f"IP диапазон {ip_range} расширен до: {expanded_ips}")
-                for ip in expanded_ips:
-                    print(f"Сканируем IP: {ip}")
-                    self.ant.scan_miner(ip)
-
-    def expand_ip_range(self, ip_range):
-        """Расширяем диапазон IP адресов в список."""
+            # Диапазоны уже скомпилированы; адреса, входящие в предыдущие контейнеры, из них исключены
+            container_ranges[container_name] = self.container_ranges.ranges([container_name])
+            for label, ip_range in container_ranges[container_name].items():
+                print(f"IP диапазон {label}: {len(ip_range)} адресов")
+                self.scanned_ips |= ip_range
+
+        self.scan_container_ranges = container_ranges
+        full = self.ui.full_discovery.get()  # проверить все адреса, не пропуская известные пустые
+        selected = {name: self.containers.get(name, {}) for name in selected_containers}
+
+        async def scan(stop_event):
+            # Проверяем все шлюзы Mikrotik параллельно и не сканируем контейнеры с недоступным шлюзом
+            statuses = await check_containers(selected)
+            ranges = {}
+            for container_name, container_range in container_ranges.items():
+                status = statuses.get(container_name)
+                self.gateway_statuses.put((container_name, status))
+                if status is not None and not status.up:
+                    print(f"Mikrotik контейнера {container_name} недоступен, сканирование пропущено")
+                    continue
+                ranges.update(container_range)
+            return await self.scanner.scan_ranges(ranges, self.results.put_async, stop_event,
+                                                  discovery=self.discovery, full=full)
+
+        if self.scan_thread and self.scan_thread.is_alive():
+            self.scanner.stop()
+        self.scan_thread = self.scanner.start_thread(scan, on_done=self.report_sweep)
+        self.scan_stop_event = self.scanner.stop_event
+        self.start_polling()
+
+    def start_metrics_server(self, port=9105):
+        """Отдаём метрики сканирования Prometheus на http://127.0.0.1:port/metrics."""
         try:
-            # Если IP-диапазон имеет формат CIDR, например, 10.4.101.0/24
-            if ip_range.endswith('/24'):
-                network = ip_network(ip_range, strict=False)
-                return [str(ip) for ip in network.hosts()]
-            # Если IP-диапазон имеет формат, например, 10.4.101.1-255
-            elif '-' in ip_range:
-                base_ip, range_part = ip_range.rsplit('.', 1)
-                start_ip, end_ip = range_part.split('-')
-                start = ip_address(f"{base_ip}.{start_ip}")
-                end = ip_address(f"{base_ip}.{end_ip}")
-                return [str(ip) for ip in ip_network(f"{base_ip}/{end - start}", strict=False).hosts() if start <= ip <= end]
-            # Если IP-диапазон имеет формат, например, 10.4.101 (весь диапазон 10.4.101.1-255)
-            elif len(ip_range.split('.')) == 3:
-                base_ip = ip_range
-                return [f"{base_ip}.{i}" for i in range(1, 256)]
-        except ValueError:
-            return []
-        return []
+            self.metrics_server = MetricsServer(self.metrics, port=port).start()
+        except OSError as exc:
+            print(f"Эндпоинт метрик на порту {port} не запущен: {exc}")
 
-    def search_tree(self, event):
-        """Функция поиска в дереве."""
-        search_text = self.ui.search_entry.get().lower()
-        for item in self.ui.tree.get_children():
-            values = self.ui.tree.item(item, 'values')
-            if any(search_text in str(value).lower() for value in values):
-                self.ui.tree.selection_add(item)
+    def start_polling(self):
+        """Запускаем периодический перенос результатов в таблицу, если он ещё не идёт."""
+        if not self.polling:
+            self.polling = True
+            self.root.after(16, self.poll_scan_results)
+
+    def update_ip_containers(self):
+        """Пересобираем диапазоны и индекс IP -> контейнер для всех контейнеров."""
+        self.container_ranges.update(self.containers)
+        self.ip_containers = None
+        errors = self.container_ranges.errors
+        if errors and errors != self.range_errors:
+            lines = [f"{name}: {error}" for name, container_errors in errors.items() for error in container_errors]
+            messagebox.showwarning("Ошибка", "Неверные диапазоны в data.json пропущены:\n" + "\n".join(lines))
+        self.range_errors = errors
+
+    def monitor_targets(self):
+        """Адреса для мониторинга {ip: контейнер}; словарь строится только когда он нужен."""
+        targets = self.ip_containers
+        if targets is None:
+            targets = self.ip_containers = dict(self.container_ranges.items())
+        return targets
+
+    def check_config(self):
+        """Подхватываем изменения data.json, сделанные другим экземпляром или вручную."""
+        try:
+            containers = self.config.reload_if_changed()
+        except OSError as exc:
+            print(f"Не удалось прочитать {self.config.path}: {exc}")
+            containers = None
+        if containers is not None:
+            self.containers = containers
+            self.update_ip_containers()
+            self.update_container_listbox()
+            print(f"Конфигурация контейнеров обновлена: {len(containers)} контейнеров")
+        self.root.after(2000, self.check_config)
+
+    def start_monitoring(self):
+        """Запускаем непрерывный мониторинг всех контейнеров."""
+        print(f"Мониторинг запущен: {len(self.monitor_targets())} адресов")
+        self.monitor.start()
+        self.start_polling()
+
+    def stop_monitoring(self):
+        """Останавливаем мониторинг."""
+        self.monitor.stop()
+        print("Мониторинг остановлен")
+
+    def report_sweep(self, range_stats):
+        """Выводим долю живых адресов по каждому диапазону и задержки по контейнерам."""
+        if range_stats:
+            print("Заполненность диапазонов:")
+            for stats in range_stats.values():
+                print(f"  {stats}")
+        report = self.timeouts.report()
+        if report:
+            print(f"Задержки:\n{report}")
+
+    def poll_scan_results(self):
+        """Переносим результаты сканирования из очереди в таблицу пакетами (~60 кадров в секунду)."""
+        scanning = self.scan_thread is not None and self.scan_thread.is_alive()
+        batch = self.results.drain()
+        for ip, values in batch:
+            self.found_ips.add(ip)
+            self.ui.update_tree(ip, values)
+            self.history.add(ip, self.container_ranges.container_of(ip), values)
+        if batch:
+            self.ui.flush_tree()
+        self.ui.set_scan_progress(repr(self.metrics.progress))
+        while not self.gateway_statuses.empty():
+            container_name, status = self.gateway_statuses.get()
+            if status is not None:
+                print(f"Mikrotik {container_name}: {status}")
+            if status is not None and not status.up:
+                # Контейнер не сканировался, его строки в таблице не трогаем
+                for ip_range in self.scan_container_ranges.get(container_name, {}).values():
+                    self.scanned_ips -= ip_range
+                self.ui.update_container_status(container_name, "red")
             else:
-                self.ui.tree.selection_remove(item)
+                self.ui.update_container_status(container_name, "")
+        while not self.alerts.empty():
+            ip, container_name, reason = self.alerts.get()
+            print(f"[{container_name}] {ip}: {reason}")
+            self.ui.update_container_status(container_name, "orange")
+        if not scanning and self.results.empty() and self.scanned_ips:
+            if not self.scan_stop_event.is_set():
+                # Аппараты из просканированных диапазонов, которые не ответили, убираем из таблицы
+                self.ui.remove_rows([ip for ip in self.ui.model.keys if ip in self.scanned_ips and ip not in self.found_ips])
+            self.scanned_ips = IpRange()
+        if scanning or self.monitor.is_running() or not self.results.empty():
+            self.root.after(16, self.poll_scan_results)
+        else:
+            self.polling = False
+
+    def on_close(self):
+        """Останавливаем фоновые задачи и дописываем историю перед выходом."""
+        self.scanner.stop()
+        self.monitor.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.export_job is not None:
+            self.export_job.cancel()
+            self.export_job.finished.wait(5)
+        self.history.close()
+        self.root.destroy()
+
+    def search_tree(self, event):
+        """Функция поиска в дереве: фильтр строк по подстроке."""
+        search_text = self.ui.search_entry.get()
+        self.ui.table.set_filter("" if search_text == 'Поиск' else search_text)
 
     def open_container_window(self, event):
         """Открываем окно с данными выбранного контейнера."""
-        selected_items = self.ui.tree.selection()
-        for item in selected_items:
-            ip = self.ui.tree.item(item, 'values')[0]
+        for values in self.ui.table.selected_values():
+            ip = values[0]
             messagebox.showinfo("IP-адрес", f"IP: {ip}")
 
     def on_double_click(self, event):
@@ -130,9 +279,9 @@ class App:
 
     def copy_selection(self, event):
         """Копируем выбранные данные из дерева."""
-        selected_items = self.ui.tree.selection()
+        selected_items = self.ui.table.selected_values()
         if selected_items:
-            data = "\n".join([", ".join(self.ui.tree.item(item, 'values')) for item in selected_items])
+            data = "\n".join([", ".join(values) for values in selected_items])
             self.root.clipboard_clear()
             self.root.clipboard_append(data)
             self.root.update()  # Оба действия (очистка и добавление) должны быть в одном вызове update
@@ -141,30 +290,87 @@ class App:
         """Показываем контекстное меню."""
         self.ui.show_context_menu(event)
 
+    def show_analytics(self):
+        """Показываем сводку по результатам последнего сканирования."""
+        df = load_sweep(self.ui.model.rows(), self.container_ranges.container_of)
+        if df.empty:
+            messagebox.showinfo("Аналитика", "Нет данных сканирования")
+            return
+        self.ui.show_text_window("Аналитика: сканирование", fleet_report(df))
+
+    def show_history_analytics(self):
+        """Показываем сводку по средним показателям за последние сутки."""
+        now = time.time()
+        df = load_history(self.history, now - 86400, now)
+        if df.empty:
+            messagebox.showinfo("Аналитика", "Нет данных в истории")
+            return
+        self.ui.show_text_window("Аналитика: сутки", fleet_report(df))
+
+    def show_scan_metrics(self):
+        """Показываем счётчики и времена опроса по контейнерам."""
+        self.ui.show_text_window("Метрики сканирования", self.metrics.report())
+
     def show_info(self):
         """Отображаем информацию о приложении."""
         messagebox.showinfo("Информация", "Информация о приложении")
 
     def export_to_csv(self):
         """Экспортируем данные в CSV."""
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv",
-                                               filetypes=[("CSV файлы", "*.csv")])
-        if file_path:
-            with open(file_path, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["IP", "Type", "GHS av", "GHS 5s", "total_freqavg", "miner_version", "Pool", "User", "Elapsed"])
-                for item in self.ui.tree.get_children():
-                    values = self.ui.tree.item(item, 'values')
-                    writer.writerow(values)
+        self.export_table(".csv", ("CSV файлы", "*.csv"))
 
     def export_to_xlsx(self):
         """Экспортируем данные в XLSX."""
-        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx",
-                                               filetypes=[("Excel файлы", "*.xlsx")])
+        self.export_table(".xlsx", ("Excel файлы", "*.xlsx"))
+
+    def export_to_parquet(self):
+        """Экспортируем данные в Parquet."""
+        self.export_table(".parquet", ("Parquet файлы", "*.parquet"))
+
+    def export_table(self, extension, filetype):
+        """Выгружаем таблицу в текущем порядке и с текущим фильтром."""
+        file_path = filedialog.asksaveasfilename(defaultextension=extension, filetypes=[filetype])
         if file_path:
-            data = [self.ui.tree.item(item, 'values') for item in self.ui.tree.get_children()]
-            df = pd.DataFrame(data, columns=["IP", "Type", "GHS av", "GHS 5s", "total_freqavg", "miner_version", "Pool", "User", "Elapsed"])
-            df.to_excel(file_path, index=False)
+            total, rows = self.ui.model.snapshot()
+            self.start_export(ExportJob(typed_rows(rows), file_path, COLUMNS, total))
+
+    def export_history(self):
+        """Выгружаем историю за последнюю неделю (5-минутные агрегаты)."""
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                                 filetypes=[("CSV файлы", "*.csv"), ("Excel файлы", "*.xlsx"),
+                                                            ("Parquet файлы", "*.parquet")])
+        if file_path:
+            end = time.time()
+            start = end - 7 * 86400
+
+            def prepare():
+                # В фоновом потоке: запись в SQLite может ждать блокировку до 30 с
+                self.history.flush()
+                return self.history.count_window(start, end)
+
+            rows = history_rows(self.history.iter_window(start, end))
+            self.start_export(ExportJob(rows, file_path, HISTORY_COLUMNS, prepare=prepare))
+
+    def start_export(self, job):
+        """Запускаем экспорт в фоне и показываем прогресс."""
+        if self.export_job is not None and not self.export_job.finished.is_set():
+            messagebox.showwarning("Экспорт", "Предыдущий экспорт ещё не завершён")
+            return
+        try:
+            self.export_job = job.start()
+        except ExportError as exc:
+            messagebox.showwarning("Экспорт", str(exc))
+            return
+        self.poll_export()
+
+    def poll_export(self):
+        """Обновляем строку прогресса, пока экспорт идёт."""
+        job = self.export_job
+        self.ui.set_progress(job.status())
+        if not job.finished.is_set():
+            self.root.after(200, self.poll_export)
+        elif job.error is not None:
+            messagebox.showwarning("Экспорт", str(job.error))
 
 if __name__ == "__main__":
     root = tk.Tk()
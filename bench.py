@@ -0,0 +1,225 @@
+# src/bench.py
+"""Замер скорости сканирования на имитируемой ферме (farm.py).
+
+Пример: python bench.py --miners 2000 --empty 2000 --latency 0.05 --drop 0.01 --engines ant,async,sweep
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ant import Ant
+from farm import FakeFarm, FarmOptions, raise_fd_limit
+from iprange import IpRange, ip_to_int
+from scanner import AsyncScanner
+from sharded import ShardedScanner
+from timeouts import TimeoutPolicy
+
+if sys.platform != "win32":
+    import resource
+
+ENGINES = ("ant", "async", "sweep", "sharded")
+
+class BenchResult:
+    """Итог одного прогона: скорость, задержки, процессорное время и память."""
+
+    def __init__(self, engine, addresses, found, elapsed, latencies, cpu, children_cpu, maxrss):
+        self.engine = engine
+        self.addresses = addresses
+        self.found = found
+        self.elapsed = elapsed
+        self.latencies = sorted(latencies)  # время опроса одного аппарата, с
+        self.cpu = cpu  # процессорное время этого процесса, с
+        self.children_cpu = children_cpu  # процессорное время завершившихся дочерних процессов, с
+        self.maxrss = maxrss  # пиковый размер резидентной памяти процесса замера, МБ (None — неизвестен)
+
+    @property
+    def rate(self):
+        return self.found / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p):
+        if not self.latencies:
+            return None
+        return self.latencies[min(len(self.latencies) - 1, int(len(self.latencies) * p / 100))]
+
+    def as_dict(self):
+        return {
+            "engine": self.engine, "addresses": self.addresses, "found": self.found,
+            "elapsed": round(self.elapsed, 3), "miners_per_sec": round(self.rate, 1),
+            "p50_ms": None if self.percentile(50) is None else round(self.percentile(50) * 1000, 1),
+            "p99_ms": None if self.percentile(99) is None else round(self.percentile(99) * 1000, 1),
+            "cpu": round(self.cpu, 2), "children_cpu": round(self.children_cpu, 2),
+            "maxrss_mb": None if self.maxrss is None else round(self.maxrss, 1),
+        }
+
+    def __repr__(self):
+        def ms(value):
+            return "-" if value is None else f"{value * 1000:.1f}"
+        rss = "-" if self.maxrss is None else f"{self.maxrss:.1f}"
+        return (f"{self.engine:8} {self.found:>7}/{self.addresses:<7} {self.elapsed:7.2f} с {self.rate:9.1f}/с "
+                f"p50 {ms(self.percentile(50)):>7} мс p99 {ms(self.percentile(99)):>7} мс "
+                f"CPU {self.cpu:6.2f}+{self.children_cpu:.2f} с RSS {rss:>7} МБ")
+
+def peak_rss():
+    """Пиковый размер резидентной памяти за время жизни процесса, МБ; None на Windows."""
+    if sys.platform == "win32":
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def measure(engine, addresses, run):
+    """Запускаем run() и снимаем время, процессорное время и память.
+
+    Пиковая память — за всю жизнь процесса, поэтому каждый движок замеряется
+    в отдельном процессе (engine_main).
+    """
+    cpu_started = time.process_time()
+    children = os.times()
+    started = time.perf_counter()
+    found, latencies = run()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    children_after = os.times()
+    children_cpu = max(0.0, children_after.children_user + children_after.children_system
+                       - children.children_user - children.children_system)
+    return BenchResult(engine, addresses, found, elapsed, latencies, cpu, children_cpu, peak_rss())
+
+def policy(args):
+    return TimeoutPolicy(connect_timeout=args.timeout, response_timeout=args.timeout, retries=args.retries)
+
+def bench_ant(args, ips):
+    """Ant: блокирующие сокеты в пуле потоков (прежний способ сканирования из интерфейса)."""
+    ant = Ant(timeouts=policy(args))
+    found = []
+    latencies = []
+    lock = threading.Lock()
+    ant.set_update_tree_callback(lambda ip, values: found.append(ip))
+
+    def scan(ip):
+        started = time.perf_counter()
+        ant.scan_miner(ip)
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(scan, ips))
+    return len(found), latencies
+
+def timed_scanner(args):
+    """AsyncScanner, замеряющий время опроса каждого аппарата."""
+    scanner = AsyncScanner(concurrency=args.concurrency, timeout=args.timeout, timeouts=policy(args))
+    latencies = []
+    scan_miner = scanner.scan_miner
+
+    async def timed(ip):
+        started = time.perf_counter()
+        try:
+            return await scan_miner(ip)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    scanner.scan_miner = timed
+    return scanner, latencies
+
+def bench_async(args, ips):
+    """AsyncScanner.scan: полный опрос каждого адреса."""
+    scanner, latencies = timed_scanner(args)
+    found = []
+    asyncio.run(scanner.scan(ips, lambda ip, values: found.append(ip)))
+    return len(found), latencies
+
+def bench_sweep(args, ranges):
+    """AsyncScanner.scan_ranges: проверка порта, затем опрос живых адресов."""
+    scanner, latencies = timed_scanner(args)
+    found = []
+    asyncio.run(scanner.scan_ranges(ranges, lambda ip, values: found.append(ip)))
+    return len(found), latencies
+
+def bench_sharded(args, ranges):
+    """ShardedScanner: время опроса отдельных аппаратов в дочерних процессах не замеряется."""
+    scanner = ShardedScanner(processes=args.processes or None, concurrency=args.concurrency,
+                             timeout=args.timeout, retries=args.retries)
+    found = []
+    scanner.scan_ranges(ranges, lambda ip, values: found.append(ip))
+    return len(found), []
+
+def run_engine(engine, args, ip_range):
+    addresses = len(ip_range)
+    ranges = {"bench": ip_range}
+    if engine == "ant":
+        return measure(engine, addresses, lambda: bench_ant(args, ip_range.addresses()))
+    if engine == "async":
+        return measure(engine, addresses, lambda: bench_async(args, ip_range.addresses()))
+    if engine == "sweep":
+        return measure(engine, addresses, lambda: bench_sweep(args, ranges))
+    return measure(engine, addresses, lambda: bench_sharded(args, ranges))
+
+def engine_main(engine, args, ip_range, conn):
+    """Процесс одного замера: память и процессорное время не смешиваются с другими движками."""
+    raise_fd_limit()
+    conn.send(run_engine(engine, args, ip_range))
+    conn.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Замер скорости сканирования на имитируемой ферме")
+    parser.add_argument("--miners", type=int, default=1000, help="число имитируемых аппаратов")
+    parser.add_argument("--empty", type=int, default=0, help="пустых адресов в диапазоне после аппаратов")
+    parser.add_argument("--first", default="127.42.0.1", help="первый адрес фермы (127.0.0.0/8)")
+    parser.add_argument("--latency", type=float, default=0.02, help="средняя задержка ответа аппарата, с")
+    parser.add_argument("--jitter", type=float, default=0.01, help="разброс задержки, с")
+    parser.add_argument("--drop", type=float, default=0.0, help="доля соединений без ответа")
+    parser.add_argument("--truncate", type=float, default=0.0, help="доля оборванных ответов")
+    parser.add_argument("--malformed", type=float, default=0.0, help="доля ответов с испорченным JSON")
+    parser.add_argument("--no-multi", action="store_true", help="аппараты не принимают команды вида stats+pools")
+    parser.add_argument("--engines", default="ant,async,sweep", help=f"через запятую из: {', '.join(ENGINES)}")
+    parser.add_argument("--concurrency", type=int, default=512, help="параллельных опросов AsyncScanner")
+    parser.add_argument("--threads", type=int, default=64, help="потоков для Ant")
+    parser.add_argument("--processes", type=int, default=0, help="процессов ShardedScanner (0 — по числу ядер)")
+    parser.add_argument("--timeout", type=float, default=1.0, help="таймаут до первых замеров задержки, с")
+    parser.add_argument("--retries", type=int, default=2, help="повторов временных ошибок")
+    parser.add_argument("--seed", type=int, help="зерно генератора случайных чисел фермы")
+    parser.add_argument("--json", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+    args.engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+    unknown = [engine for engine in args.engines if engine not in ENGINES]
+    if unknown:
+        parser.error(f"неизвестные движки: {', '.join(unknown)}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    raise_fd_limit()
+    options = FarmOptions(latency=args.latency, jitter=args.jitter, drop=args.drop, truncate=args.truncate,
+                          malformed=args.malformed, multi=not args.no_multi, seed=args.seed)
+    first = ip_to_int(args.first)
+    ip_range = IpRange([(first, first + args.miners + args.empty - 1)])
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with FakeFarm(args.miners, args.first, options):
+        print(f"Ферма: {args.miners} аппаратов, {args.empty} пустых адресов", file=sys.stderr)
+        for engine in args.engines:
+            reader, writer = context.Pipe(duplex=False)
+            process = context.Process(target=engine_main, args=(engine, args, ip_range, writer))
+            process.start()
+            writer.close()
+            try:
+                result = reader.recv()
+            except EOFError:
+                print(f"{engine}: процесс замера завершился с ошибкой", file=sys.stderr)
+                continue
+            finally:
+                process.join()
+            print(result)
+            results.append(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"farm": vars(options), "results": [result.as_dict() for result in results]}, f,
+                      ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
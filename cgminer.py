@@ -0,0 +1,181 @@
+# src/cgminer.py
+import asyncio
+import json
+
+PORT = 4028
+
+# Команды, которые запрашиваются у каждого аппарата для таблицы
+BASE_COMMANDS = ("stats", "pools")
+
+class ResponseError(ValueError):
+    """Ответ аппарата не удалось разобрать."""
+
+class EmptyResponse(ResponseError):
+    """Аппарат закрыл соединение, ничего не ответив."""
+
+class TruncatedResponse(ResponseError):
+    """Соединение закрылось посреди ответа (нет завершающего NUL, JSON не дописан)."""
+
+class MalformedResponse(ResponseError):
+    """Ответ получен целиком, но это не JSON даже после исправления известных ошибок прошивок."""
+
+class CommandRejected(ResponseError):
+    """Прошивка вернула STATUS == 'E' (например, не поддерживает составные команды)."""
+
+# Ошибки одного запроса: сетевые, таймауты и ошибки разбора ответа
+QUERY_ERRORS = (OSError, asyncio.TimeoutError, ResponseError)
+
+class ResponseReader:
+    """Накопление ответа в заранее выделенном буфере до NUL или закрытия соединения.
+
+    Буфер растёт удвоением, поэтому чтение большого ответа линейно по его размеру.
+    """
+
+    def __init__(self, size=16384):
+        self.buffer = bytearray(size)
+        self.length = 0
+        self.terminated = False  # встретился ли завершающий NUL
+
+    def reserve(self, size):
+        free = len(self.buffer) - self.length
+        if free < size:
+            self.buffer.extend(bytes(max(size - free, len(self.buffer))))
+
+    def advance(self, size):
+        """Учитываем size новых байт в конце буфера; всё после NUL отбрасываем."""
+        end = self.length + size
+        nul = self.buffer.find(0, self.length, end)
+        if nul >= 0:
+            self.length = nul
+            self.terminated = True
+        else:
+            self.length = end
+
+    def feed(self, chunk):
+        """Добавляем прочитанный фрагмент (для потоков asyncio); после NUL данные не нужны."""
+        if self.terminated:
+            return
+        self.reserve(len(chunk))
+        self.buffer[self.length:self.length + len(chunk)] = chunk
+        self.advance(len(chunk))
+
+    def read_socket(self, sock):
+        """Читаем ответ из блокирующего сокета напрямую в буфер."""
+        while not self.terminated:
+            if self.length == len(self.buffer):
+                self.reserve(len(self.buffer))
+            view = memoryview(self.buffer)[self.length:]
+            try:
+                size = sock.recv_into(view)
+            finally:
+                view.release()
+            if not size:
+                break
+            self.advance(size)
+        return self
+
+    def data(self):
+        return bytes(memoryview(self.buffer)[:self.length])
+
+def build_request(commands):
+    """Формируем запрос к API cgminer; несколько команд объединяются через '+'."""
+    if isinstance(commands, str):
+        commands = (commands,)
+    return json.dumps({"command": "+".join(commands)}).encode("utf-8")
+
+def fix_quirks(text):
+    """Исправляем известные ошибки JSON в ответах прошивок."""
+    # bmminer/Antminer: между объектами в массиве STATS нет запятой
+    return text.replace("}{", "},{")
+
+def decode_reply(data, terminated=True):
+    """Разбираем ответ аппарата целиком; ошибки возвращаются типизированными исключениями."""
+    if not data:
+        raise EmptyResponse("пустой ответ")
+    text = bytes(data).decode("utf-8", "replace")
+    try:
+        reply = json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        try:
+            reply = json.loads(fix_quirks(text), strict=False)
+        except json.JSONDecodeError as exc:
+            error = MalformedResponse if terminated else TruncatedResponse
+            raise error(f"{exc.msg} (позиция {exc.pos} из {len(text)})") from exc
+    if not isinstance(reply, dict):
+        raise MalformedResponse(f"ожидался объект JSON, получено {type(reply).__name__}")
+    return reply
+
+def parse_replies(reader, commands):
+    """Разбираем ответ на одну или несколько команд и возвращаем {команда: ответ}.
+
+    Ответ всегда проходит json.loads (разбор на C), поэтому испорченный JSON
+    поднимает MalformedResponse, а не превращается в неверные значения полей.
+    Если прошивка отклонила команду, поднимается CommandRejected.
+    """
+    if isinstance(commands, str):
+        commands = (commands,)
+    reply = decode_reply(reader.data(), reader.terminated)
+    if len(commands) == 1:
+        if is_rejected(reply):
+            raise CommandRejected(reply["STATUS"][0].get("Msg", ""))
+        return {commands[0]: reply}
+    replies = split_multi_reply(reply, commands)
+    if replies is None:
+        raise CommandRejected("составная команда не поддерживается")
+    return replies
+
+def fetch_plan(commands, multi=True):
+    """Порядок запросов при опросе аппарата, общий для Ant и AsyncScanner.
+
+    Генератор выдаёт запросы — составной (кортеж команд) или по одной команде —
+    и получает через send() ответ {команда: ответ} или исключение из QUERY_ERRORS.
+    Отклонённый составной запрос повторяется по командам. Ошибка команды
+    таблицы (stats, pools) поднимается, ошибки дополнительных команд только
+    собираются. Возвращает (ответы, ошибки дополнительных команд).
+    """
+    replies = {}
+    errors = []
+    if multi and len(commands) > 1:
+        result = yield tuple(commands)
+        if isinstance(result, Exception) and not isinstance(result, CommandRejected):
+            raise result
+        if not isinstance(result, Exception):
+            replies = result
+    for command in commands:
+        if command in replies:
+            continue
+        result = yield command
+        if isinstance(result, Exception):
+            if command in BASE_COMMANDS:
+                raise result
+            errors.append(result)
+        else:
+            replies.update(result)
+    return replies, errors
+
+def is_rejected(reply):
+    """Проверяем, отклонила ли прошивка команду (STATUS == 'E')."""
+    status = reply.get("STATUS") if isinstance(reply, dict) else None
+    if isinstance(status, list) and status and isinstance(status[0], dict):
+        return status[0].get("STATUS") == "E"
+    return False
+
+def split_multi_reply(reply, commands):
+    """Разбиваем составной ответ на ответы отдельных команд.
+
+    Составной ответ имеет вид {"stats": [{...}], "pools": [{...}]}.
+    Возвращаем None, если прошивка отклонила составную команду целиком;
+    отклонённые или отсутствующие части в словарь не попадают.
+    """
+    if not isinstance(reply, dict) or is_rejected(reply):
+        return None
+    replies = {}
+    for command in commands:
+        part = reply.get(command)
+        if isinstance(part, list) and part and isinstance(part[0], dict):
+            part = part[0]
+        if isinstance(part, dict) and not is_rejected(part):
+            replies[command] = part
+    if not replies:
+        return None
+    return replies
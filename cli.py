@@ -0,0 +1,159 @@
+# src/cli.py
+"""Сканирование контейнеров без графического интерфейса.
+
+Пример: python cli.py 401 402 --format csv --output scan.csv --concurrency 1024
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import sys
+
+from ant import COLUMNS
+from data import load_containers
+from discovery import DB_PATH as DISCOVERY_PATH, DiscoveryCache
+from iprange import ContainerRanges
+from metrics import Metrics
+from ping import check_containers
+from scanner import AsyncScanner
+from sharded import ShardedScanner
+from timeouts import TimeoutPolicy
+
+EXIT_OK = 0  # найден хотя бы один аппарат
+EXIT_NO_MINERS = 1  # сканирование прошло, но ни один аппарат не ответил
+EXIT_USAGE = 2  # неверные аргументы или неизвестный контейнер
+EXIT_INTERRUPTED = 130
+
+class NdjsonWriter:
+    """Пишет результаты построчно в формате NDJSON."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, container, values):
+        record = dict(zip(COLUMNS, values))
+        record["container"] = container
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+class CsvWriter:
+    """Пишет результаты в CSV с заголовком."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.writer.writerow(COLUMNS + ("container",))
+
+    def write(self, container, values):
+        self.writer.writerow(list(values) + [container])
+        self.stream.flush()
+
+WRITERS = {"ndjson": NdjsonWriter, "csv": CsvWriter}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Сканирование аппаратов без графического интерфейса")
+    parser.add_argument("containers", nargs="*", help="контейнеры для сканирования (по умолчанию все)")
+    parser.add_argument("--data", help="путь к data.json")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="ndjson", help="формат вывода")
+    parser.add_argument("--output", help="файл для результатов (по умолчанию stdout)")
+    parser.add_argument("--concurrency", type=int, default=512, help="число одновременных опросов (на процесс)")
+    parser.add_argument("--processes", type=int, default=1, help="число процессов сканирования (0 — по числу ядер)")
+    parser.add_argument("--timeout", type=float, default=2.0, help="таймаут запроса до первых замеров задержки, с")
+    parser.add_argument("--retries", type=int, default=2, help="повторов при таймауте или обрыве ответа")
+    parser.add_argument("--no-sweep", action="store_true", help="не проверять порт перед полным опросом")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать кэш обнаружения")
+    parser.add_argument("--rediscover", action="store_true",
+                        help="проверить все адреса, включая известные пустые (кэш обновляется)")
+    parser.add_argument("--metrics-file", help="записать метрики в формате Prometheus в файл (только с --processes 1)")
+    parser.add_argument("--no-gateway-check", action="store_true",
+                        help="сканировать контейнеры, даже если их Mikrotik недоступен")
+    return parser.parse_args(argv)
+
+def discovery_path(data_path):
+    """Кэш обнаружения хранится рядом с data.json."""
+    if not data_path:
+        return DISCOVERY_PATH
+    return os.path.join(os.path.dirname(os.path.abspath(data_path)), "discovery.db")
+
+def main(argv=None):
+    args = parse_args(argv)
+    containers = load_containers(args.data)
+    names = args.containers or list(containers)
+    unknown = [name for name in names if name not in containers]
+    if unknown or args.concurrency < 1 or args.processes < 0 or args.retries < 0:
+        message = (f"неизвестные контейнеры: {', '.join(unknown)}" if unknown
+                   else "--concurrency должно быть больше 0, --processes и --retries — не меньше 0")
+        print(message, file=sys.stderr)
+        return EXIT_USAGE
+    single_process = [flag for flag, used in (("--no-sweep", args.no_sweep), ("--no-cache", args.no_cache),
+                                              ("--rediscover", args.rediscover)) if used]
+    if args.processes != 1 and single_process:
+        # Многопроцессное сканирование всегда проверяет порт всех адресов и не использует кэш обнаружения
+        print(f"{', '.join(single_process)} работает только с --processes 1", file=sys.stderr)
+        return EXIT_USAGE
+    if args.processes != 1 and args.metrics_file:
+        # Процессы-воркеры не передают метрики обратно: файл с нулями выглядел бы как «ошибок нет»
+        print("--metrics-file работает только с --processes 1", file=sys.stderr)
+        return EXIT_USAGE
+
+    if not args.no_gateway_check:
+        statuses = asyncio.run(check_containers({name: containers[name] for name in names}))
+        for name, status in statuses.items():
+            print(f"Mikrotik {name}: {status}", file=sys.stderr)
+        names = [name for name in names if name not in statuses or statuses[name].up]
+
+    container_ranges = ContainerRanges(containers)
+    for name, errors in container_ranges.errors.items():
+        for error in errors:
+            print(f"Контейнер {name}: {error}", file=sys.stderr)
+    ranges = container_ranges.ranges(names)
+    timeouts = TimeoutPolicy(connect_timeout=args.timeout, response_timeout=args.timeout, retries=args.retries,
+                             container_of=container_ranges.container_of)
+    metrics = Metrics(container_of=container_ranges.container_of)
+    scanner = AsyncScanner(concurrency=args.concurrency, timeout=args.timeout, timeouts=timeouts, metrics=metrics)
+    stream = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    writer = WRITERS[args.format](stream)
+    found = 0
+
+    def on_result(ip, values):
+        nonlocal found
+        found += 1
+        writer.write(container_ranges.container_of(ip), values)
+
+    range_stats = {}
+    try:
+        if args.processes != 1:
+            sharded = ShardedScanner(processes=args.processes or None, concurrency=args.concurrency,
+                                     timeout=args.timeout, retries=args.retries)
+            range_stats = sharded.scan_ranges(ranges, on_result)
+        elif args.no_sweep:
+            ips = itertools.chain.from_iterable(ip_range.addresses() for ip_range in ranges.values())
+            asyncio.run(scanner.scan(ips, on_result))
+        else:
+            discovery = None if args.no_cache else DiscoveryCache(discovery_path(args.data))
+            range_stats = asyncio.run(scanner.scan_ranges(ranges, on_result, discovery=discovery,
+                                                          full=args.rediscover))
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # Читатель закрыл вывод (например, head); дальнейший вывод в stdout не нужен
+        sys.stdout = None
+        return EXIT_OK if found else EXIT_NO_MINERS
+    finally:
+        if args.output:
+            stream.close()
+
+    for stats in range_stats.values():
+        print(stats, file=sys.stderr)
+    report = timeouts.report()
+    if report:
+        print(report, file=sys.stderr)
+    if args.metrics_file:
+        metrics.write_textfile(args.metrics_file)
+    print(f"Найдено аппаратов: {found}", file=sys.stderr)
+    return EXIT_OK if found else EXIT_NO_MINERS
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,166 @@
 # src/data.py
+import hashlib
 import json
 import os
+import stat
+import sys
+import time
+import uuid
 
-def save_containers(containers):
-    """Сохраняет данные о контейнерах в файл data.json."""
-    with open(os.path.join(os.path.dirname(__file__), "data.json"), "w") as f:
-        json.dump(containers, f, indent=4)
+DATA_PATH = os.path.join(os.path.dirname(__file__), "data.json")
 
-def load_containers():
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+class FileLock:
+    """Межпроцессная блокировка через файл рядом с data.json.
+
+    Не даёт двум экземплярам приложения или приложению и консольному
+    сканеру одновременно переписывать конфигурацию.
+    """
+
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, "a+b")
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if sys.platform == "win32":
+                    self.file.seek(0)
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except OSError:
+                if time.monotonic() >= deadline:
+                    self.file.close()
+                    raise TimeoutError(f"файл {self.path} заблокирован другим процессом")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        if sys.platform == "win32":
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+
+class ConfigStore:
+    """Хранилище контейнеров в data.json.
+
+    Запись атомарна (временный файл и os.replace), изменения делаются под
+    межпроцессной блокировкой поверх актуального содержимого файла, так что
+    параллельные экземпляры не затирают друг друга. Изменения файла извне
+    определяются по mtime и размеру, а затем по хешу содержимого.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DATA_PATH
+        self.lock_path = f"{self.path}.lock"
+        self.signature = None  # (mtime_ns, размер) последней прочитанной или записанной версии
+        self.digest = None  # хеш содержимого этой версии
+
+    def stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def read(self):
+        """Читаем файл и запоминаем его версию; (контейнеры, хеш)."""
+        signature = self.stat()
+        if signature is None:
+            self.signature, self.digest = None, None
+            return {}, None
+        with open(self.path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+        self.signature, self.digest = signature, digest
+        return json.loads(content.decode("utf-8")) if content.strip() else {}, digest
+
+    def load(self):
+        """Загружаем контейнеры из файла."""
+        return self.read()[0]
+
+    def write(self, containers):
+        """Атомарно записываем контейнеры; без изменений файл не переписывается."""
+        content = json.dumps(containers, indent=4).encode("utf-8")
+        digest = hashlib.sha1(content).hexdigest()
+        if digest == self.digest and self.stat() == self.signature:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = os.path.join(directory, f".data-{uuid.uuid4().hex}.json")
+        # Не mkstemp: его режим 0600 перешёл бы на data.json, и сканер под другим
+        # пользователем (cron, systemd) перестал бы читать конфигурацию
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(self.path).st_mode))
+            except FileNotFoundError:
+                pass  # новый файл: режим по umask
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.signature, self.digest = self.stat(), digest
+
+    def update(self, change):
+        """Применяем change(контейнеры) к актуальному содержимому файла и сохраняем; возвращаем результат."""
+        with FileLock(self.lock_path):
+            containers = self.load()
+            change(containers)
+            self.write(containers)
+        return containers
+
+    def save(self, containers):
+        """Заменяем содержимое файла целиком."""
+        with FileLock(self.lock_path):
+            self.write(containers)
+
+    def set_container(self, name, data):
+        def change(containers):
+            containers[name] = data
+        return self.update(change)
+
+    def delete_container(self, name):
+        def change(containers):
+            containers.pop(name, None)
+        return self.update(change)
+
+    def changed(self):
+        """Изменился ли файл с момента последнего чтения или записи."""
+        signature = self.stat()
+        if signature == self.signature:
+            return False
+        if signature is None:
+            return True
+        with open(self.path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        if digest == self.digest:
+            self.signature = signature  # файл переписан без изменений
+            return False
+        return True
+
+    def reload_if_changed(self):
+        """Новые контейнеры, если файл изменился извне, иначе None."""
+        if not self.changed():
+            return None
+        try:
+            return self.load()
+        except ValueError:
+            return None  # файл дописывается не атомарно (например, редактором); прочитаем позже
+
+def load_containers(file_path=None):
     """Загружает данные о контейнерах из файла data.json."""
-    file_path = os.path.join(os.path.dirname(__file__), "data.json")
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            return json.load(f)
-    return {}
+    return ConfigStore(file_path).load()
@@ -0,0 +1,146 @@
+# src/discovery.py
+import os
+import sqlite3
+import time
+from array import array
+from itertools import chain
+
+from iprange import IpRange, int_to_ip, ip_to_int
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "discovery.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS addresses (
+    ip INTEGER PRIMARY KEY,
+    model TEXT,
+    last_seen INTEGER NOT NULL DEFAULT 0,
+    last_probe INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+class AddressState:
+    """Последнее известное состояние адреса."""
+
+    __slots__ = ("model", "last_seen", "last_probe", "failures")
+
+    def __init__(self, model=None, last_seen=0, last_probe=0, failures=0):
+        self.model = model
+        self.last_seen = last_seen  # время последнего успешного опроса аппарата
+        self.last_probe = last_probe
+        self.failures = failures  # неудачных проверок подряд
+
+class DiscoveryCache:
+    """Кэш обнаружения аппаратов между сканированиями, хранится рядом с data.json.
+
+    Известные аппараты проверяются первыми и при каждом сканировании, пока
+    не пропустят miss_limit проверок подряд. Пустые адреса (порт закрыт)
+    проверяются реже: через base_interval после первой неудачи, затем с
+    удвоением интервала до max_interval. Новые адреса и адреса с открытым
+    портом, опрос которых не удался (аппарат занят, перезагружается, испорченный
+    ответ), проверяются всегда.
+    """
+
+    def __init__(self, path=DB_PATH, base_interval=600, max_interval=86400, miss_limit=3):
+        self.path = path
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.miss_limit = miss_limit
+        self.entries = {}  # IP числом -> AddressState
+        self.dirty = set()
+        self.load()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def load(self):
+        conn = self.connect()
+        try:
+            for ip, model, last_seen, last_probe, failures in conn.execute(
+                    "SELECT ip, model, last_seen, last_probe, failures FROM addresses"):
+                self.entries[ip] = AddressState(model, last_seen, last_probe, failures)
+        finally:
+            conn.close()
+
+    def save(self):
+        """Записываем изменённые адреса одной транзакцией."""
+        if not self.dirty:
+            return 0
+        dirty, self.dirty = self.dirty, set()
+        rows = []
+        for ip in dirty:
+            entry = self.entries[ip]
+            rows.append((ip, entry.model, entry.last_seen, entry.last_probe, entry.failures))
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO addresses (ip, model, last_seen, last_probe, failures) "
+                                 "VALUES (?, ?, ?, ?, ?)", rows)
+        finally:
+            conn.close()
+        return len(rows)
+
+    def is_known_miner(self, entry):
+        return entry is not None and entry.last_seen > 0 and entry.failures < self.miss_limit
+
+    def interval(self, failures):
+        """Интервал повторной проверки пустого адреса после failures неудач подряд.
+
+        Если порт при последней проверке был открыт (failures == 0), адрес не пропускается.
+        """
+        if failures <= 0:
+            return 0
+        return min(self.max_interval, self.base_interval * 2 ** min(max(failures - 1, 0), 20))
+
+    def plan(self, ranges, full=False, now=None):
+        """Порядок проверки диапазонов {метка: адреса или IpRange}.
+
+        Возвращаем ({метка: адреса строками, известные аппараты первыми}, {метка: пропущено}).
+        При full=True проверяются все адреса.
+        """
+        now = now or time.time()
+        planned = {}
+        skipped = {}
+        for label, ips in ranges.items():
+            known = array('I')
+            rest = array('I')
+            count = 0
+            for value in ips if isinstance(ips, IpRange) else map(ip_to_int, ips):
+                entry = self.entries.get(value)
+                if self.is_known_miner(entry):
+                    known.append(value)
+                elif full or entry is None or now - entry.last_probe >= self.interval(entry.failures):
+                    rest.append(value)
+                else:
+                    count += 1
+            planned[label] = map(int_to_ip, chain(known, rest))
+            skipped[label] = count
+        return planned, skipped
+
+    def state(self, ip):
+        value = ip_to_int(ip)
+        entry = self.entries.get(value)
+        if entry is None:
+            entry = self.entries[value] = AddressState()
+        self.dirty.add(value)
+        return entry
+
+    def probed(self, ip, ok, now=None):
+        """Учитываем результат проверки порта."""
+        entry = self.state(ip)
+        entry.last_probe = int(now or time.time())
+        entry.failures = 0 if ok else entry.failures + 1
+
+    def found(self, ip, model, now=None):
+        """Учитываем успешный опрос аппарата."""
+        entry = self.state(ip)
+        entry.model = model
+        entry.last_seen = entry.last_probe = int(now or time.time())
+        entry.failures = 0
+
+    def summary(self):
+        """Число известных аппаратов и пустых адресов в кэше."""
+        miners = sum(1 for entry in self.entries.values() if self.is_known_miner(entry))
+        return miners, len(self.entries) - miners
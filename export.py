@@ -0,0 +1,187 @@
+# src/export.py
+import csv
+import datetime
+import os
+import threading
+
+from ant import COLUMNS, NUMERIC_COLUMNS, parse_float
+from iprange import int_to_ip
+
+# Столбцы выгрузки истории (строки HistoryStore.iter_window)
+HISTORY_COLUMNS = ("IP", "ts", "container", "Type", "GHS av", "GHS 5s", "total_freqavg", "Elapsed")
+INTEGER_COLUMNS = ("Elapsed",)
+TIME_COLUMNS = ("ts",)
+FORMATS = ("csv", "xlsx", "parquet")
+BATCH_SIZE = 10000
+
+class ExportError(Exception):
+    """Экспорт невозможен: неизвестный формат или не установлена нужная библиотека."""
+
+def column_type(name):
+    if name in TIME_COLUMNS:
+        return "time"
+    if name in INTEGER_COLUMNS:
+        return "int"
+    if name in NUMERIC_COLUMNS:
+        return "float"
+    return "str"
+
+def typed_rows(rows, columns=COLUMNS):
+    """Строки таблицы (строковые значения) с числами в числовых столбцах; пустые значения — None."""
+    types = [column_type(name) for name in columns]
+    for row in rows:
+        result = []
+        for kind, value in zip(types, row):
+            if kind == "float" or kind == "int":
+                value = parse_float(value)
+                if kind == "int" and value is not None:
+                    value = int(value)
+            elif value == "":
+                value = None
+            result.append(value)
+        yield result
+
+def history_rows(rows):
+    """Строки истории: IP и время в привычном виде, остальные значения уже типизированы."""
+    for ip, ts, *rest in rows:
+        yield [int_to_ip(ip), datetime.datetime.fromtimestamp(ts)] + rest
+
+def format_for(path):
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension not in FORMATS:
+        raise ExportError(f"неизвестный формат файла: {path}")
+    return extension
+
+class CsvExporter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, row):
+        self.writer.writerow(["" if value is None else value for value in row])
+
+    def close(self):
+        self.file.close()
+
+class XlsxExporter:
+    """XLSX в режиме write_only: строки сразу уходят во временный файл, а не в память."""
+
+    def __init__(self, path, columns):
+        try:
+            from openpyxl import Workbook
+        except ImportError as exc:
+            raise ExportError("для экспорта в XLSX нужен пакет openpyxl") from exc
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("data")
+        self.sheet.append(list(columns))
+
+    def write(self, row):
+        self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+class ParquetExporter:
+    """Parquet пакетами по BATCH_SIZE строк с типами столбцов (нужен pyarrow)."""
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ExportError("для экспорта в Parquet нужен пакет pyarrow") from exc
+        self.pa = pa
+        types = {"time": pa.timestamp("s"), "int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+        self.columns = list(columns)
+        self.schema = pa.schema([(name, types[column_type(name)]) for name in self.columns])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.batch = [[] for _ in self.columns]
+
+    def write(self, row):
+        for column, value in zip(self.batch, row):
+            column.append(value)
+        if len(self.batch[0]) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.batch[0]:
+            arrays = [self.pa.array(column, type=field.type) for column, field in zip(self.batch, self.schema)]
+            self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+            self.batch = [[] for _ in self.columns]
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+EXPORTERS = {"csv": CsvExporter, "xlsx": XlsxExporter, "parquet": ParquetExporter}
+
+def export_rows(rows, path, columns=COLUMNS, progress=None, stop_event=None):
+    """Пишем типизированные строки в файл формата по расширению; возвращаем число строк.
+
+    progress(записано строк) вызывается каждые BATCH_SIZE строк и в конце.
+    """
+    exporter = EXPORTERS[format_for(path)](path, columns)
+    count = 0
+    try:
+        for row in rows:
+            if stop_event is not None and stop_event.is_set():
+                break
+            exporter.write(row)
+            count += 1
+            if progress and count % BATCH_SIZE == 0:
+                progress(count)
+    finally:
+        exporter.close()
+    if progress:
+        progress(count)
+    return count
+
+class ExportJob:
+    """Экспорт в фоновом потоке; состояние читается из потока интерфейса."""
+
+    def __init__(self, rows, path, columns=COLUMNS, total=None, prepare=None):
+        self.rows = rows
+        self.path = path
+        self.columns = columns
+        self.total = total  # ожидаемое число строк, если известно
+        self.prepare = prepare  # callable, выполняемый в фоновом потоке до экспорта; возвращает total
+        self.done = 0
+        self.error = None
+        self.stop_event = threading.Event()
+        self.finished = threading.Event()
+        self.thread = None
+
+    def start(self):
+        format_for(self.path)  # неизвестный формат — ошибка сразу, а не в фоновом потоке
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            if self.prepare is not None:
+                self.total = self.prepare()
+            export_rows(self.rows, self.path, self.columns, self.set_progress, self.stop_event)
+        except Exception as exc:  # openpyxl, pyarrow, sqlite3: любая ошибка должна попасть в status()
+            self.error = exc
+        finally:
+            self.finished.set()
+
+    def set_progress(self, done):
+        self.done = done
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def status(self):
+        """Текст для строки состояния."""
+        name = os.path.basename(self.path)
+        if self.error is not None:
+            return f"Экспорт {name}: ошибка: {self.error}"
+        if self.finished.is_set():
+            return f"Экспорт {name}: готово, {self.done} строк"
+        if self.total:
+            return f"Экспорт {name}: {self.done}/{self.total} ({self.done / self.total:.0%})"
+        return f"Экспорт {name}: {self.done} строк"
@@ -0,0 +1,202 @@
+# src/farm.py
+"""Имитация фермы: тысячи API cgminer/bmminer на адресах 127.x.x.x.
+
+Весь диапазон 127.0.0.0/8 на Linux относится к loopback, поэтому каждый
+аппарат слушает порт 4028 на своём адресе и сканеры работают с фермой без
+изменений. На macOS и Windows дополнительные адреса нужно добавить на
+loopback-интерфейс вручную.
+"""
+import asyncio
+import json
+import multiprocessing
+import random
+import sys
+
+from cgminer import PORT
+from iprange import int_to_ip, ip_to_int
+
+if sys.platform != "win32":
+    import resource
+
+MODELS = (("Antminer S19j Pro", 100000), ("Antminer S19", 95000), ("Antminer T19", 84000), ("Antminer S9", 13500))
+
+class FarmOptions:
+    """Поведение имитируемых аппаратов."""
+
+    def __init__(self, latency=0.02, jitter=0.01, drop=0.0, truncate=0.0, malformed=0.0, multi=True, seed=None):
+        self.latency = latency  # средняя задержка ответа, с
+        self.jitter = jitter  # разброс задержки (равномерно ±jitter), с
+        self.drop = drop  # доля соединений, закрытых без ответа
+        self.truncate = truncate  # доля ответов, оборванных на середине без NUL
+        self.malformed = malformed  # доля ответов с испорченным JSON
+        self.multi = multi  # поддержка команд вида "stats+pools"
+        self.seed = seed
+
+def stats_reply(ip, rng):
+    """Ответ на stats в формате bmminer: две записи, вторая — с показателями и цепочками."""
+    model, nominal = MODELS[ip_to_int(ip) % len(MODELS)]
+    ghs = nominal * rng.uniform(0.85, 1.02)
+    details = {
+        "STATS": 0, "ID": "BC50", "Elapsed": rng.randint(1000, 2000000), "Calls": 0, "Wait": 0.0,
+        "Max": 0.0, "Min": 99999999.0, "GHS 5s": f"{ghs * rng.uniform(0.97, 1.03):.2f}",
+        "GHS av": f"{ghs:.2f}", "miner_count": 3, "frequency": "650", "fan_num": 4,
+        "total_acn": 228, "total_rate": round(ghs, 2), "total_rateideal": nominal,
+        "total_freqavg": f"{rng.uniform(600, 700):.2f}", "total_acsn": 228, "no_matching_work": 0,
+        "miner_version": "uart_trans.1.3", "CompileTime": "Fri Nov 17 17:37:49 CST 2023", "Type": model,
+    }
+    for fan in range(1, 5):
+        details[f"fan{fan}"] = rng.randint(3600, 6000)
+    for chain in range(1, 4):
+        details[f"temp{chain}"] = rng.randint(55, 75)
+        details[f"temp2_{chain}"] = rng.randint(60, 85)
+        details[f"chain_acn{chain}"] = 76
+        details[f"chain_acs{chain}"] = " ooooooo ooooooo ooooooo ooooooo ooooooo ooooooo ooooooo ooooooo ooooooo ooooooo"
+        details[f"chain_hw{chain}"] = rng.randint(0, 200)
+        details[f"chain_rate{chain}"] = f"{ghs / 3:.2f}"
+        details[f"freq_avg{chain}"] = 650
+    return {
+        "STATUS": [{"STATUS": "S", "When": 1700000000, "Code": 70, "Msg": "CGMiner stats", "Description": "cgminer 4.9.2"}],
+        "STATS": [{"CGMiner": "4.9.2", "Miner": "uart_trans.1.3", "CompileTime": details["CompileTime"], "Type": model},
+                  details],
+        "id": 1,
+    }
+
+def pools_reply(ip, rng):
+    pools = []
+    for number, host in enumerate(("btc.pool-a.com", "btc.pool-b.com", "btc.pool-c.com")):
+        pools.append({
+            "POOL": number, "URL": f"stratum+tcp://{host}:3333", "Status": "Alive", "Priority": number,
+            "Quota": 1, "Long Poll": "N", "Getworks": rng.randint(1000, 90000), "Accepted": rng.randint(1000, 90000),
+            "Rejected": rng.randint(0, 100), "Discarded": 0, "Stale": 0, "Get Failures": 0,
+            "Remote Failures": 0, "User": f"farm.{ip.replace('.', 'x')}", "Last Share Time": "0:00:12",
+            "Diff": "65.5K", "Difficulty Accepted": 1.0e9, "Difficulty Rejected": 1.0e6,
+        })
+    return {"STATUS": [{"STATUS": "S", "When": 1700000000, "Code": 7, "Msg": "3 Pool(s)"}], "POOLS": pools, "id": 1}
+
+REPLIES = {"stats": stats_reply, "pools": pools_reply}
+
+def build_reply(ip, command, options, rng):
+    """Ответ аппарата на команду (или несколько через '+')."""
+    commands = command.split("+")
+    if any(name not in REPLIES for name in commands) or (len(commands) > 1 and not options.multi):
+        return {"STATUS": [{"STATUS": "E", "Code": 14, "Msg": "Invalid command"}], "id": 1}
+    if len(commands) == 1:
+        return REPLIES[command](ip, rng)
+    return {name: [REPLIES[name](ip, rng)] for name in commands}
+
+class FakeMiner:
+    """Обработчик соединений одного имитируемого аппарата."""
+
+    def __init__(self, ip, options, rng):
+        self.ip = ip
+        self.options = options
+        self.rng = rng
+
+    async def handle(self, reader, writer):
+        options = self.options
+        rng = self.rng
+        try:
+            request = await reader.read(4096)
+            delay = max(0.0, options.latency + rng.uniform(-options.jitter, options.jitter))
+            await asyncio.sleep(delay)
+            roll = rng.random()
+            if roll < options.drop or not request:
+                return
+            try:
+                command = json.loads(request.rstrip(b"\0"))["command"]
+            except (ValueError, KeyError):
+                command = ""
+            data = json.dumps(build_reply(self.ip, command, options, rng)).encode()
+            roll -= options.drop
+            if roll < options.truncate:
+                writer.write(data[:len(data) // 2])
+            elif roll - options.truncate < options.malformed:
+                # Мусор между полями, а не внутри строки, чтобы JSON точно стал невалидным
+                middle = data.find(b', "', len(data) // 2) + 1
+                writer.write(data[:middle] + b"#garbage" + data[middle:] + b"\0")
+            else:
+                writer.write(data + b"\0")
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+def raise_fd_limit():
+    """Поднимаем ограничение на число открытых файлов до жёсткого предела (на Windows его нет)."""
+    if sys.platform == "win32":
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+def farm_main(ips, options, port, ready, stop):
+    """Процесс фермы: поднимаем серверы на всех адресах и ждём сигнала остановки."""
+    raise_fd_limit()
+    rng = random.Random(options.seed)
+
+    async def serve():
+        servers = []
+        for ip in ips:
+            miner = FakeMiner(ip, options, rng)
+            servers.append(await asyncio.start_server(miner.handle, ip, port, backlog=64))
+        ready.set()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, stop.wait)
+        for server in servers:
+            server.close()
+
+    asyncio.run(serve())
+
+class FakeFarm:
+    """Ферма из count имитируемых аппаратов, начиная с адреса first.
+
+    Аппараты распределяются по нескольким процессам (per_process адресов
+    на процесс), чтобы ферма не ограничивала пропускную способность сканера.
+    """
+
+    def __init__(self, count, first="127.42.0.1", options=None, port=PORT, per_process=1000):
+        self.count = count
+        self.first = ip_to_int(first)
+        self.options = options or FarmOptions()
+        self.port = port
+        self.per_process = per_process
+        self.context = multiprocessing.get_context("spawn")
+        self.stop_event = self.context.Event()
+        self.processes = []
+
+    @property
+    def ips(self):
+        return [int_to_ip(self.first + offset) for offset in range(self.count)]
+
+    def start(self, timeout=60):
+        ips = self.ips
+        events = []
+        for start in range(0, len(ips), self.per_process):
+            ready = self.context.Event()
+            process = self.context.Process(target=farm_main, daemon=True,
+                                           args=(ips[start:start + self.per_process], self.options, self.port,
+                                                 ready, self.stop_event))
+            process.start()
+            self.processes.append(process)
+            events.append(ready)
+        for ready in events:
+            if not ready.wait(timeout):
+                self.stop()
+                raise RuntimeError("ферма не запустилась")
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
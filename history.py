@@ -0,0 +1,281 @@
+# src/history.py
+import os
+import sqlite3
+import threading
+import time
+from ipaddress import ip_address
+
+from ant import COLUMNS, parse_float
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "history.db")
+
+# Разрешения хранения: таблица, ширина интервала в секундах, срок хранения в секундах
+RESOLUTIONS = {
+    "raw": ("samples", 1, 2 * 86400),
+    "5m": ("rollup_5m", 300, 30 * 86400),
+    "1h": ("rollup_1h", 3600, None),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    ip INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    container INTEGER,
+    type INTEGER,
+    ghs_av REAL,
+    ghs_5s REAL,
+    freq REAL,
+    version INTEGER,
+    pool INTEGER,
+    user INTEGER,
+    elapsed INTEGER,
+    PRIMARY KEY (ip, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS samples_container_ts ON samples (container, ts);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    ip INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    container INTEGER,
+    type INTEGER,
+    n INTEGER,
+    ghs_av REAL,
+    ghs_5s REAL,
+    ghs_5s_min REAL,
+    freq REAL,
+    elapsed INTEGER,
+    PRIMARY KEY (ip, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {table}_container_ts ON {table} (container, ts);
+CREATE INDEX IF NOT EXISTS {table}_ts ON {table} (ts);
+"""
+
+# Колонки, которые возвращают запросы по любому разрешению
+QUERY_FIELDS = ("ts", "ghs_av", "ghs_5s", "freq", "elapsed")
+
+class HistoryStore:
+    """Хранилище истории показателей аппаратов на SQLite в режиме WAL.
+
+    Сэмплы копятся в памяти и пишутся пакетами из фонового потока. Тот же поток
+    периодически сворачивает сырые данные в 5-минутные и часовые агрегаты
+    и удаляет данные старше срока хранения.
+    """
+
+    def __init__(self, path=DB_PATH, flush_interval=1.0, batch_size=5000, rollup_interval=300.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.rollup_interval = rollup_interval
+        self.buffer = []
+        self.buffer_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = threading.Event()
+        self.labels = {}
+        self.local = threading.local()
+
+        conn = self.connect()
+        conn.executescript(SCHEMA)
+        for name in ("5m", "1h"):
+            conn.executescript(ROLLUP_SCHEMA.format(table=RESOLUTIONS[name][0]))
+        conn.commit()
+
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+    def connect(self):
+        """Соединение для текущего потока (SQLite не разделяет соединения между потоками)."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def add(self, ip, container, values, ts=None):
+        """Добавляем строку таблицы (значения build_values) в очередь на запись."""
+        sample = (int(ts if ts is not None else time.time()), ip, container, values)
+        with self.buffer_lock:
+            self.buffer.append(sample)
+            full = len(self.buffer) >= self.batch_size
+        if full:
+            self.wakeup.set()
+
+    def label_id(self, conn, text):
+        """Возвращаем идентификатор строки из справочника, добавляя её при необходимости."""
+        if text is None or text == "":
+            return None
+        text = str(text)
+        label = self.labels.get(text)
+        if label is None:
+            conn.execute("INSERT OR IGNORE INTO labels (text) VALUES (?)", (text,))
+            label = conn.execute("SELECT id FROM labels WHERE text = ?", (text,)).fetchone()[0]
+            self.labels[text] = label
+        return label
+
+    def flush(self):
+        """Записываем накопленные сэмплы одной транзакцией."""
+        with self.buffer_lock:
+            batch, self.buffer = self.buffer, []
+        if not batch:
+            return 0
+        conn = self.connect()
+        rows = []
+        with conn:
+            for ts, ip, container, values in batch:
+                row = dict(zip(COLUMNS, values))
+                elapsed = parse_float(row["Elapsed"])
+                rows.append((
+                    int(ip_address(ip)), ts,
+                    self.label_id(conn, container),
+                    self.label_id(conn, row["Type"]),
+                    parse_float(row["GHS av"]),
+                    parse_float(row["GHS 5s"]),
+                    parse_float(row["total_freqavg"]),
+                    self.label_id(conn, row["miner_version"]),
+                    self.label_id(conn, row["Pool"]),
+                    self.label_id(conn, row["User"]),
+                    int(elapsed) if elapsed is not None else None,
+                ))
+            conn.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def watermark(self, conn, key):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def rollup(self, now=None):
+        """Сворачиваем завершённые интервалы в агрегаты и удаляем устаревшие данные."""
+        now = int(now if now is not None else time.time())
+        conn = self.connect()
+        with conn:
+            # raw -> 5m
+            table, width, _ = RESOLUTIONS["5m"]
+            start = self.watermark(conn, table)
+            end = now // width * width
+            if end > start:
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO {table}
+                    SELECT ip, ts / {width} * {width}, MAX(container), MAX(type), COUNT(*), AVG(ghs_av), AVG(ghs_5s),
+                           MIN(ghs_5s), AVG(freq), MAX(elapsed)
+                    FROM samples WHERE ts >= ? AND ts < ?
+                    GROUP BY ip, ts / {width}""", (start, end))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (table, end))
+
+            # 5m -> 1h, средние взвешиваются по числу сэмплов
+            source = table
+            table, width, _ = RESOLUTIONS["1h"]
+            start = self.watermark(conn, table)
+            end = min(end, now // width * width)
+            if end > start:
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO {table}
+                    SELECT ip, ts / {width} * {width}, MAX(container), MAX(type), SUM(n),
+                           SUM(ghs_av * n) / SUM(n), SUM(ghs_5s * n) / SUM(n), MIN(ghs_5s_min),
+                           SUM(freq * n) / SUM(n), MAX(elapsed)
+                    FROM {source} WHERE ts >= ? AND ts < ?
+                    GROUP BY ip, ts / {width}""", (start, end))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (table, end))
+
+            for table, _, retention in RESOLUTIONS.values():
+                if retention:
+                    conn.execute(f"DELETE FROM {table} WHERE ts < ?", (now - retention,))
+
+    def writer(self):
+        """Фоновый поток записи."""
+        next_rollup = time.monotonic() + self.rollup_interval
+        while not self.closed.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+            if time.monotonic() >= next_rollup:
+                self.rollup()
+                next_rollup = time.monotonic() + self.rollup_interval
+        self.flush()
+
+    def close(self):
+        """Дописываем буфер и останавливаем поток записи."""
+        self.closed.set()
+        self.wakeup.set()
+        self.thread.join()
+
+    def pick_resolution(self, start, end):
+        """Выбираем самое подробное разрешение, которое ещё хранится для начала интервала."""
+        age = time.time() - start
+        for name in ("raw", "5m"):
+            if age < RESOLUTIONS[name][2]:
+                return name
+        return "1h"
+
+    def query(self, where, params, start, end, resolution="auto"):
+        if resolution == "auto":
+            resolution = self.pick_resolution(start, end)
+        table = RESOLUTIONS[resolution][0]
+        sql = (f"SELECT ip, {', '.join(QUERY_FIELDS)} FROM {table} "
+               f"WHERE {where} AND ts >= ? AND ts < ? ORDER BY ip, ts")
+        return self.connect().execute(sql, (*params, int(start), int(end))).fetchall()
+
+    def miner(self, ip, start, end, resolution="auto"):
+        """История одного аппарата: [(ip, ts, ghs_av, ghs_5s, freq, elapsed), ...]."""
+        return self.query("ip = ?", (int(ip_address(ip)),), start, end, resolution)
+
+    def container(self, name, start, end, resolution="auto"):
+        """История всех аппаратов контейнера."""
+        label = self.connect().execute("SELECT id FROM labels WHERE text = ?", (name,)).fetchone()
+        if label is None:
+            return []
+        return self.query("container = ?", (label[0],), start, end, resolution)
+
+    def farm(self, start, end, resolution="auto"):
+        """Суммарный хешрейт фермы по интервалам: [(ts, число аппаратов, сумма GHS av, сумма GHS 5s), ...]."""
+        if resolution == "auto":
+            resolution = self.pick_resolution(start, end)
+        table, width, _ = RESOLUTIONS[resolution]
+        width = max(width, 60)  # сырые сэмплы группируем по минутам
+        sql = (f"SELECT bucket, COUNT(*), SUM(ghs_av), SUM(ghs_5s) FROM ("
+               f"SELECT ts / {width} * {width} AS bucket, ip, AVG(ghs_av) AS ghs_av, AVG(ghs_5s) AS ghs_5s "
+               f"FROM {table} WHERE ts >= ? AND ts < ? GROUP BY bucket, ip) "
+               f"GROUP BY bucket ORDER BY bucket")
+        return self.connect().execute(sql, (int(start), int(end))).fetchall()
+
+    def window_cursor(self, start, end, resolution="auto"):
+        if resolution == "auto":
+            resolution = self.pick_resolution(start, end)
+        table = RESOLUTIONS[resolution][0]
+        sql = (f"SELECT s.ip, s.ts, c.text, t.text, s.ghs_av, s.ghs_5s, s.freq, s.elapsed FROM {table} s "
+               f"LEFT JOIN labels c ON c.id = s.container LEFT JOIN labels t ON t.id = s.type "
+               f"WHERE s.ts >= ? AND s.ts < ?")
+        return self.connect().execute(sql, (int(start), int(end)))
+
+    def window(self, start, end, resolution="auto"):
+        """Все сэмплы интервала с названиями контейнера и модели:
+        [(ip, ts, контейнер, модель, ghs_av, ghs_5s, freq, elapsed), ...]."""
+        return self.window_cursor(start, end, resolution).fetchall()
+
+    def iter_window(self, start, end, resolution="auto", batch_size=5000):
+        """То же, что window, но строки читаются с диска пакетами по batch_size."""
+        cursor = self.window_cursor(start, end, resolution)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+    def count_window(self, start, end, resolution="auto"):
+        """Число сэмплов интервала."""
+        if resolution == "auto":
+            resolution = self.pick_resolution(start, end)
+        table = RESOLUTIONS[resolution][0]
+        return self.connect().execute(f"SELECT COUNT(*) FROM {table} WHERE ts >= ? AND ts < ?",
+                                      (int(start), int(end))).fetchone()[0]
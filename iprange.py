@@ -0,0 +1,306 @@
+# src/iprange.py
+"""Диапазоны IP-адресов контейнеров.
+
+Запись диапазона (spec) состоит из элементов, разделённых пробелами, запятыми или ';':
+  10.4.0.0/16            — любая CIDR-сеть (без адреса сети и широковещательного для /30 и шире)
+  10.4.101.10-10.4.102.20 — произвольный диапазон адресов
+  10.4.101-103.1-200     — диапазоны по октетам, '*' — весь октет (0-255)
+  10.4.101               — недостающие октеты: средние 0-255, последний 1-255
+  !10.4.101.1            — исключение (любая из форм выше после '!')
+
+Исключения из любой записи контейнера действуют на все его записи
+(compile_container), поэтому ip_ranges вида ["10.4.101", "!10.4.101.1"] работают.
+"""
+import bisect
+import re
+from functools import lru_cache
+from ipaddress import ip_network
+from itertools import product
+
+OCTET = re.compile(r"^(\d{1,3})(?:-(\d{1,3}))?$")
+SEPARATORS = re.compile(r"[\s,;]+")
+MAX_INTERVALS = 65536
+
+class RangeSpecError(ValueError):
+    """Ошибка в записи диапазона IP."""
+
+def ip_to_int(ip):
+    a, b, c, d = map(int, ip.split('.'))
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+def int_to_ip(value):
+    return f"{value >> 24 & 255}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}"
+
+def merge(intervals):
+    """Объединяем пересекающиеся и соседние интервалы [начало, конец]."""
+    result = []
+    for start, end in sorted(intervals):
+        if result and start <= result[-1][1] + 1:
+            if end > result[-1][1]:
+                result[-1] = (result[-1][0], end)
+        else:
+            result.append((start, end))
+    return result
+
+def subtract(intervals, other):
+    """Вычитаем из отсортированных интервалов другие отсортированные интервалы."""
+    result = []
+    j = 0
+    for start, end in intervals:
+        while j < len(other) and other[j][1] < start:
+            j += 1
+        k = j
+        while k < len(other) and other[k][0] <= end:
+            if other[k][0] > start:
+                result.append((start, other[k][0] - 1))
+            start = max(start, other[k][1] + 1)
+            k += 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+class IpRange:
+    """Неизменяемое множество IP-адресов в виде отсортированных интервалов.
+
+    Итерация лениво выдаёт адреса числами, addresses() — строками;
+    проверка вхождения выполняется двоичным поиском.
+    """
+
+    def __init__(self, intervals=()):
+        self.intervals = tuple(merge(intervals))
+        self.starts = [start for start, _ in self.intervals]
+        self.size = sum(end - start + 1 for start, end in self.intervals)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def __contains__(self, ip):
+        value = ip_to_int(ip) if isinstance(ip, str) else ip
+        i = bisect.bisect_right(self.starts, value) - 1
+        return i >= 0 and value <= self.intervals[i][1]
+
+    def __or__(self, other):
+        return IpRange(self.intervals + other.intervals)
+
+    def __sub__(self, other):
+        return IpRange(subtract(self.intervals, other.intervals))
+
+    def __eq__(self, other):
+        return isinstance(other, IpRange) and self.intervals == other.intervals
+
+    def __hash__(self):
+        return hash(self.intervals)
+
+    def __repr__(self):
+        parts = [int_to_ip(start) if start == end else f"{int_to_ip(start)}-{int_to_ip(end)}"
+                 for start, end in self.intervals[:3]]
+        more = ", ..." if len(self.intervals) > 3 else ""
+        return f"IpRange({', '.join(parts)}{more}; {self.size} адресов)"
+
+    def addresses(self):
+        """Адреса строками, по одному."""
+        for value in self:
+            yield int_to_ip(value)
+
+def parse_address(text):
+    parts = text.split('.')
+    if len(parts) != 4 or not all(part.isdigit() and int(part) <= 255 for part in parts):
+        raise RangeSpecError(f"неверный адрес {text}")
+    return ip_to_int(text)
+
+def parse_octets(term):
+    """Диапазоны по октетам (10.4.101-103.1-200) в список интервалов."""
+    parts = term.split('.')
+    if not 1 <= len(parts) <= 4:
+        raise RangeSpecError(f"неверный диапазон {term}")
+    bounds = []
+    for part in parts:
+        if part == '*':
+            bounds.append((0, 255))
+            continue
+        match = OCTET.match(part)
+        if not match:
+            raise RangeSpecError(f"неверный октет {part} в {term}")
+        low = int(match.group(1))
+        high = int(match.group(2) or low)
+        if not low <= high <= 255:
+            raise RangeSpecError(f"неверный октет {part} в {term}")
+        bounds.append((low, high))
+    bounds += [(0, 255)] * (3 - len(bounds)) + [(1, 255)] * (4 - len(bounds))
+
+    # Октеты после последнего неполного вместе с ним дают один непрерывный интервал
+    last = 3
+    while last > 0 and bounds[last] == (0, 255):
+        last -= 1
+    count = 1
+    for low, high in bounds[:last]:
+        count *= high - low + 1
+    if count > MAX_INTERVALS:
+        raise RangeSpecError(f"слишком много интервалов в {term}")
+    shift = 8 * (3 - last)
+    low, high = bounds[last]
+    intervals = []
+    for head in product(*(range(a, b + 1) for a, b in bounds[:last])):
+        base = 0
+        for octet in head:
+            base = base << 8 | octet
+        base <<= 8 * (4 - last)
+        intervals.append((base | low << shift, base | high << shift | ((1 << shift) - 1)))
+    return intervals
+
+def parse_term(term):
+    """Один элемент записи в список интервалов."""
+    if '/' in term:
+        try:
+            network = ip_network(term, strict=False)
+        except ValueError as exc:
+            raise RangeSpecError(f"неверная сеть {term}") from exc
+        if network.version != 4:
+            raise RangeSpecError(f"поддерживаются только IPv4-сети: {term}")
+        start = int(network.network_address)
+        end = int(network.broadcast_address)
+        if network.prefixlen <= 30:
+            start, end = start + 1, end - 1
+        return [(start, end)]
+    if '-' in term and term.rsplit('-', 1)[1].count('.') == 3:
+        first, last = term.rsplit('-', 1)
+        start, end = parse_address(first), parse_address(last)
+        if start > end:
+            raise RangeSpecError(f"начало диапазона больше конца: {term}")
+        return [(start, end)]
+    return parse_octets(term)
+
+@lru_cache(maxsize=1024)
+def parse_spec(spec):
+    """Запись диапазона в (включённые адреса, исключённые адреса); при ошибке — RangeSpecError."""
+    included = []
+    excluded = []
+    for term in SEPARATORS.split(spec.strip()):
+        if not term:
+            continue
+        if term.startswith('!'):
+            excluded += parse_term(term[1:])
+        else:
+            included += parse_term(term)
+    return IpRange(included), IpRange(excluded)
+
+@lru_cache(maxsize=1024)
+def compile_spec(spec):
+    """Компилируем запись диапазона в IpRange; при ошибке — RangeSpecError."""
+    included, excluded = parse_spec(spec)
+    if not included:
+        raise RangeSpecError(f"в записи {spec!r} нет адресов")
+    result = included - excluded
+    if not result:
+        raise RangeSpecError(f"все адреса {spec!r} исключены")
+    return result
+
+def compile_container(specs, on_error=None):
+    """Компилируем записи контейнера в {запись: IpRange}.
+
+    Исключения из любой записи вычитаются из всех записей контейнера; записи
+    только из исключений в результат не попадают. Ошибка в записи поднимает
+    RangeSpecError, а если задан on_error(запись, ошибка) — запись пропускается.
+    """
+    parsed = {}
+    excluded = IpRange()
+    for spec in specs:
+        try:
+            included, spec_excluded = parse_spec(spec)
+        except RangeSpecError as exc:
+            if on_error is None:
+                raise
+            on_error(spec, exc)
+            continue
+        excluded = excluded | spec_excluded
+        if included:
+            parsed[spec] = included
+    if not parsed and on_error is None:
+        raise RangeSpecError("в записях контейнера нет адресов")
+    compiled = {}
+    for spec, included in parsed.items():
+        result = included - excluded
+        if result:
+            compiled[spec] = result
+        elif on_error is None:
+            raise RangeSpecError(f"все адреса {spec!r} исключены")
+        else:
+            on_error(spec, RangeSpecError(f"все адреса {spec!r} исключены"))
+    return compiled
+
+class ContainerRanges:
+    """Скомпилированные диапазоны контейнеров.
+
+    Диапазоны кэшируются по контейнеру и компилируются заново только при
+    изменении его ip_ranges. Адрес из нескольких пересекающихся диапазонов
+    принадлежит первому из них в порядке data.json и сканируется один раз.
+    Контейнер адреса ищется по индексу подсетей /24 за O(1). Неверные записи
+    пропускаются и собираются в errors; показывать их — дело вызывающего.
+    """
+
+    def __init__(self, containers=None):
+        self.cache = {}  # контейнер -> (ip_ranges, {метка: IpRange}, [ошибки в записях])
+        self.errors = {}  # контейнер -> [текст ошибки, ...] для контейнеров с неверными записями
+        self.owned = {}  # контейнер -> {метка: IpRange} без адресов, занятых ранее
+        self.subnets = {}  # номер подсети /24 -> [(начало, конец, контейнер), ...]
+        if containers is not None:
+            self.update(containers)
+
+    def compile(self, name, ip_ranges):
+        key = tuple(ip_ranges)
+        cached = self.cache.get(name)
+        if cached is None or cached[0] != key:
+            errors = []
+            compiled = compile_container(key, lambda spec, exc: errors.append(str(exc)))
+            cached = self.cache[name] = (key, {f"{name} {spec}": ip_range for spec, ip_range in compiled.items()},
+                                         errors)
+        return cached[1]
+
+    def update(self, containers):
+        """Перекомпилируем изменённые контейнеры и заново распределяем пересечения."""
+        for name in list(self.cache):
+            if name not in containers:
+                del self.cache[name]
+        claimed = IpRange()
+        owned = {}
+        subnets = {}
+        for name, data in containers.items():
+            ranges = {}
+            for label, ip_range in self.compile(name, data.get('ip_ranges', [])).items():
+                own = ip_range - claimed
+                claimed = claimed | own
+                ranges[label] = own
+                for start, end in own.intervals:
+                    for subnet in range(start >> 8, (end >> 8) + 1):
+                        subnets.setdefault(subnet, []).append((start, end, name))
+            owned[name] = ranges
+        # Индексы заменяются целиком, чтобы потоки сканирования не видели их наполовину собранными
+        self.owned = owned
+        self.subnets = subnets
+        self.errors = {name: self.cache[name][2] for name in containers if self.cache[name][2]}
+
+    def ranges(self, names):
+        """Диапазоны {метка: IpRange} выбранных контейнеров."""
+        return {label: ip_range for name in names for label, ip_range in self.owned.get(name, {}).items()}
+
+    def container_of(self, ip):
+        """Контейнер, которому принадлежит адрес, или None."""
+        try:
+            value = ip_to_int(ip) if isinstance(ip, str) else ip
+        except ValueError:
+            return None
+        for start, end, name in self.subnets.get(value >> 8, ()):
+            if start <= value <= end:
+                return name
+        return None
+
+    def items(self):
+        """Пары (IP строкой, контейнер) для всех адресов."""
+        for name, ranges in self.owned.items():
+            for ip_range in ranges.values():
+                for ip in ip_range.addresses():
+                    yield ip, name
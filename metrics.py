@@ -0,0 +1,297 @@
+# src/metrics.py
+import asyncio
+import bisect
+import http.server
+import os
+import threading
+import time
+
+from cgminer import CommandRejected, EmptyResponse, MalformedResponse, TruncatedResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PARSE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+BYTES_BUCKETS = (512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+# Гистограммы по контейнерам: имя -> (описание, границы корзин)
+HISTOGRAMS = {
+    "miner_connect_seconds": ("Время подключения к API аппарата", LATENCY_BUCKETS),
+    "miner_response_seconds": ("Время от отправки команды до полного ответа", LATENCY_BUCKETS),
+    "miner_parse_seconds": ("Время разбора ответа", PARSE_BUCKETS),
+    "miner_response_bytes": ("Размер ответа", BYTES_BUCKETS),
+}
+
+COUNTERS = {
+    "sweep_probes_total": "Проверки порта API (result: alive, dead)",
+    "miner_polls_total": "Опросы аппаратов (result: ok, partial, error)",
+    "miner_errors_total": "Ошибки опроса аппаратов по видам",
+}
+
+ERROR_KINDS = ("refused", "timeout", "reset", "unreachable", "empty", "partial", "bad_json", "rejected", "other")
+
+def classify(exc):
+    """Вид ошибки опроса для счётчика miner_errors_total."""
+    if isinstance(exc, ConnectionRefusedError):
+        return "refused"
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    if isinstance(exc, (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)):
+        return "reset"
+    if isinstance(exc, TruncatedResponse):
+        return "partial"
+    if isinstance(exc, EmptyResponse):
+        return "empty"
+    if isinstance(exc, MalformedResponse):
+        return "bad_json"
+    if isinstance(exc, CommandRejected):
+        return "rejected"
+    if isinstance(exc, OSError):
+        return "unreachable"
+    return "other"
+
+def is_partial(replies):
+    """Ответы stats/pools без записей, из которых берутся показатели таблицы."""
+    stats = replies.get("stats", {}).get("STATS") or []
+    pools = replies.get("pools", {}).get("POOLS") or []
+    return len(stats) < 2 or not pools
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина — больше всех границ
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (верхняя граница корзины)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class ScanProgress:
+    """Ход текущего сканирования для панели прогресса."""
+
+    def __init__(self, total=0):
+        self.total = total  # адресов к проверке (0 — неизвестно)
+        self.probed = 0
+        self.alive = 0
+        self.polled = 0
+        self.found = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def eta(self):
+        """Оценка оставшегося времени по скорости проверки адресов, с."""
+        if not self.total or not self.probed or self.finished:
+            return None
+        return (self.total - self.probed) * self.elapsed / self.probed
+
+    def __repr__(self):
+        if self.total:
+            done = f"Проверено {self.probed}/{self.total} ({self.probed / self.total:.0%})"
+        else:
+            done = f"Проверено {self.probed}"
+        text = (f"{done}, живых {self.alive}, опрошено {self.polled}, найдено {self.found}, "
+                f"ошибок {self.errors}, {self.elapsed:.0f} с")
+        eta = self.eta()
+        if self.finished:
+            text += ", завершено"
+        elif eta is not None:
+            text += f", осталось ~{eta:.0f} с"
+        return text
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+class Metrics:
+    """Счётчики и гистограммы сканирования по контейнерам.
+
+    Пишутся из потоков Ant и цикла событий сканера, читаются интерфейсом
+    и HTTP-сервером метрик, поэтому все изменения идут под блокировкой.
+    """
+
+    def __init__(self, container_of=None):
+        self.container_of = container_of  # callable: IP -> контейнер или None
+        self.lock = threading.Lock()
+        self.counters = {}  # (имя, ((метка, значение), ...)) -> число
+        self.histograms = {}  # (имя, контейнер) -> Histogram
+        self.progress = ScanProgress()
+
+    def container(self, ip):
+        container = self.container_of(ip) if self.container_of and ip else None
+        return container or ""
+
+    def inc(self, name, ip, amount=1, **labels):
+        key = (name, (("container", self.container(ip)),) + tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, ip, value):
+        key = (name, self.container(ip))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def start_scan(self, total=0):
+        """Начинаем новый отсчёт прогресса; счётчики продолжают накапливаться."""
+        with self.lock:
+            self.progress = ScanProgress(total)
+
+    def finish_scan(self):
+        with self.lock:
+            self.progress.finished = time.monotonic()
+
+    def probed(self, ip, ok):
+        self.inc("sweep_probes_total", ip, result="alive" if ok else "dead")
+        with self.lock:
+            self.progress.probed += 1
+            self.progress.alive += ok
+
+    def polled(self, ip, replies, progress=True):
+        """Успешный опрос; неполные stats/pools учитываются отдельно.
+
+        progress=False — опрос мониторинга, прогресс сканирования не меняется.
+        """
+        partial = is_partial(replies)
+        self.inc("miner_polls_total", ip, result="partial" if partial else "ok")
+        if partial:
+            self.inc("miner_errors_total", ip, kind="partial")
+        if progress:
+            with self.lock:
+                self.progress.polled += 1
+                self.progress.found += 1
+
+    def record_error(self, ip, exc, counted=True, progress=True):
+        """Ошибка опроса; counted=False — ошибка необязательной команды или
+        повторённой попытки, опрос не провален."""
+        kind = classify(exc)
+        self.inc("miner_errors_total", ip, kind=kind)
+        if counted:
+            self.inc("miner_polls_total", ip, result="error")
+            if progress:
+                with self.lock:
+                    self.progress.polled += 1
+                    self.progress.errors += 1
+        return kind
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+            lines = []
+            for name, help_text in COUNTERS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (counter, labels), value in counters:
+                    if counter == name:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+            for name, (help_text, buckets) in HISTOGRAMS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (histogram_name, container), histogram in histograms:
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{format_labels((('container', container), ('le', le)))} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels((('container', container),))} {histogram.sum}")
+                    lines.append(f"{name}_count{format_labels((('container', container),))} {histogram.count}")
+            progress = self.progress
+            for name, value in (("scan_addresses_total", progress.total), ("scan_addresses_probed", progress.probed),
+                                ("scan_miners_found", progress.found), ("scan_elapsed_seconds", progress.elapsed)):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Пишем метрики в файл атомарно (для textfile-коллектора node_exporter)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def report(self):
+        """Сводка по контейнерам для показа в интерфейсе."""
+        with self.lock:
+            containers = sorted({labels[0][1] for (_, labels) in self.counters}
+                                | {container for (_, container) in self.histograms})
+            lines = [repr(self.progress), ""]
+            for container in containers:
+                polls = {dict(labels).get("result"): value for (name, labels), value in self.counters.items()
+                         if name == "miner_polls_total" and labels[0][1] == container}
+                errors = {dict(labels).get("kind"): value for (name, labels), value in self.counters.items()
+                          if name == "miner_errors_total" and labels[0][1] == container}
+                lines.append(f"{container or 'без контейнера'}: опросов {sum(polls.values())}, "
+                             f"успешно {polls.get('ok', 0)}, неполных {polls.get('partial', 0)}, "
+                             f"ошибок {polls.get('error', 0)}")
+                if errors:
+                    lines.append("  ошибки: " + ", ".join(f"{kind} {errors[kind]}" for kind in ERROR_KINDS if kind in errors))
+                for name in ("miner_connect_seconds", "miner_response_seconds", "miner_parse_seconds"):
+                    histogram = self.histograms.get((name, container))
+                    if histogram and histogram.count:
+                        lines.append(f"  {name}: среднее {histogram.sum / histogram.count * 1000:.1f} мс, "
+                                     f"p50 ≤ {histogram.quantile(0.5) * 1000:g} мс, p99 ≤ {histogram.quantile(0.99) * 1000:g} мс")
+        return "\n".join(lines)
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics для Prometheus в фоновом потоке."""
+
+    def __init__(self, metrics, host="127.0.0.1", port=9105):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # запросы Prometheus не пишем в консоль
+
+        self.server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,165 @@
+# src/monitor.py
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+from ant import COLUMNS, parse_float
+from scanner import RateLimiter
+from sweep import LivenessSweep
+
+GHS_5S = COLUMNS.index("GHS 5s")
+GHS_AV = COLUMNS.index("GHS av")
+ELAPSED = COLUMNS.index("Elapsed")
+
+class MinerState:
+    """Состояние опроса одного адреса в режиме мониторинга."""
+
+    def __init__(self, ip, container, interval):
+        self.ip = ip
+        self.container = container
+        self.interval = interval
+        self.seen = False  # отвечал ли адрес хотя бы раз
+        self.failures = 0
+        self.ghs_5s = None
+        self.elapsed = None
+
+class Monitor:
+    """Непрерывный опрос аппаратов с адаптивным интервалом для каждого из них.
+
+    Очередь с приоритетом по времени следующего опроса. Исправные аппараты
+    опрашиваются всё реже (до max_interval), а при падении GHS 5s, перезагрузке
+    (уменьшился Elapsed) или отсутствии ответа — с интервалом min_interval.
+    Суммарная нагрузка ограничена rate подключений в секунду, включая повторы.
+    Адреса, которые ещё не отвечали или перестали отвечать, сначала проверяются
+    одним подключением к порту, и полный опрос с повторами идёт только при
+    открытом порте, чтобы пустые адреса не расходовали лимит.
+    """
+
+    def __init__(self, scanner, targets, on_result, on_alert=None, rate=50.0,
+                 min_interval=10.0, base_interval=60.0, max_interval=600.0,
+                 drop_threshold=0.9, max_failures=10):
+        self.scanner = scanner
+        self.sweep = LivenessSweep(port=scanner.port, timeouts=scanner.timeouts)
+        self.targets = targets  # callable, возвращающий {ip: контейнер}
+        self.on_result = on_result
+        self.on_alert = on_alert
+        self.rate = rate
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.drop_threshold = drop_threshold  # доля от прошлого GHS 5s, ниже которой считаем падением
+        self.max_failures = max_failures  # после стольких неудач подряд адрес считается пустым
+        self.states = {}
+        self.heap = []
+        self.counter = itertools.count()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sync_targets(self, now):
+        """Добавляем новые адреса в расписание и забываем удалённые."""
+        targets = self.targets()
+        for ip in list(self.states):
+            if ip not in targets:
+                del self.states[ip]
+        for ip, container in targets.items():
+            state = self.states.get(ip)
+            if state is None:
+                self.states[ip] = MinerState(ip, container, self.base_interval)
+                self.push(ip, now)
+            else:
+                state.container = container
+
+    def push(self, ip, due):
+        heapq.heappush(self.heap, (due, next(self.counter), ip))
+
+    def alert(self, state, reason):
+        if self.on_alert:
+            self.on_alert(state.ip, state.container, reason)
+
+    def next_interval(self, state, values):
+        """Вычисляем интервал до следующего опроса по результату текущего."""
+        if values is None:
+            if not state.seen or state.failures >= self.max_failures:
+                return self.max_interval  # пустой адрес или давно пропавший аппарат
+            state.failures += 1
+            if state.failures == 1:
+                self.alert(state, "нет ответа")
+            return self.min_interval
+
+        if state.seen and state.failures:
+            self.alert(state, "снова на связи")
+        state.seen = True
+        state.failures = 0
+        ghs_5s = parse_float(values[GHS_5S])
+        elapsed = parse_float(values[ELAPSED])
+        reference = state.ghs_5s or parse_float(values[GHS_AV])
+        interval = min(self.max_interval, state.interval * 1.5)
+        if elapsed is not None and state.elapsed is not None and elapsed < state.elapsed:
+            self.alert(state, "перезагрузка")
+            interval = self.min_interval
+        elif ghs_5s is not None and reference and ghs_5s < reference * self.drop_threshold:
+            self.alert(state, f"падение хешрейта: {ghs_5s:.0f} из {reference:.0f} GH/s")
+            interval = self.min_interval
+        state.ghs_5s = ghs_5s
+        state.elapsed = elapsed
+        return interval
+
+    async def poll(self, state, limiter):
+        values = None
+        alive = True
+        if not state.seen or state.failures:
+            await limiter.acquire()
+            alive, _ = await self.sweep.probe(state.ip)
+        if alive:
+            # Панель прогресса — только для сканирования
+            values = await self.scanner.scan_miner(state.ip, progress=False, limiter=limiter)
+        if values is not None:
+            await self.scanner.emit(self.on_result, state.ip, values)
+        if self.states.get(state.ip) is state:
+            state.interval = self.next_interval(state, values)
+            self.push(state.ip, time.monotonic() + state.interval)
+
+    async def run(self, stop_event, resync=30.0):
+        """Основной цикл: ждём ближайший срок опроса и запускаем опрос с учётом лимитов."""
+        limiter = RateLimiter(self.rate)
+        slots = asyncio.Semaphore(self.scanner.concurrency)
+        tasks = set()
+        next_sync = 0.0
+        while not stop_event.is_set():
+            now = time.monotonic()
+            if now >= next_sync:
+                self.sync_targets(now)
+                next_sync = now + resync
+            if not self.heap or self.heap[0][0] > now:
+                wait = min(next_sync, self.heap[0][0] if self.heap else next_sync) - now
+                await asyncio.sleep(min(max(wait, 0.0), 0.5))
+                continue
+            _, _, ip = heapq.heappop(self.heap)
+            state = self.states.get(ip)
+            if state is None:
+                continue
+            await slots.acquire()
+            task = asyncio.ensure_future(self.poll(state, limiter))
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), slots.release()))
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def start(self):
+        """Запускаем мониторинг в фоновом потоке."""
+        if self.is_running():
+            return self.thread
+        stop_event = self.stop_event = threading.Event()
+        self.states.clear()
+        self.heap.clear()
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.run(stop_event)), daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
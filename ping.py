@@ -1,9 +1,212 @@
 # src/ping.py
-import subprocess
-
-def ping_mikrotik(ip, container_name, update_container_status_callback):
-    """Пингуем IP адрес Mikrotik и обновляем статус контейнера."""
-    if ip:
-        response = subprocess.run(['ping', '-n', '1', ip], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        status = "" if response.returncode == 0 else "red"
-        update_container_status_callback(container_name, status)
+import asyncio
+import itertools
+import os
+import socket
+import struct
+import sys
+import time
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+class GatewayStatus:
+    """Результат проверки шлюза: задержка и потери."""
+
+    def __init__(self, ip, method):
+        self.ip = ip  # адрес или имя из mikrotik_ip
+        self.method = method  # "icmp", "tcp", "icmp+tcp" (ICMP без ответа, затем TCP) или "dns"
+        self.sent = 0
+        self.rtts = []
+
+    @property
+    def received(self):
+        return len(self.rtts)
+
+    @property
+    def loss(self):
+        return 1.0 - self.received / self.sent if self.sent else 1.0
+
+    @property
+    def rtt(self):
+        """Средняя задержка в секундах или None, если ответов не было."""
+        return sum(self.rtts) / len(self.rtts) if self.rtts else None
+
+    @property
+    def up(self):
+        return self.received > 0
+
+    def __repr__(self):
+        if not self.up:
+            return f"{self.ip}: недоступен ({self.method})"
+        return f"{self.ip}: {self.rtt * 1000:.1f} мс, потери {self.loss:.0%} ({self.method})"
+
+def checksum(data):
+    """Контрольная сумма ICMP (RFC 1071)."""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def echo_request(ident, seq):
+    payload = b"miner-scaner" + struct.pack("!d", time.monotonic())
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum(header + payload), ident, seq) + payload
+
+def open_icmp_socket():
+    """Открываем ICMP-сокет: сначала непривилегированный (Linux/macOS), затем raw.
+
+    Возвращаем (сокет, raw) или (None, None), если ICMP недоступен.
+    """
+    if sys.platform == "win32":
+        return None, None  # цикл событий Proactor не поддерживает add_reader
+    for kind, raw in ((socket.SOCK_DGRAM, False), (socket.SOCK_RAW, True)):
+        try:
+            sock = socket.socket(socket.AF_INET, kind, socket.IPPROTO_ICMP)
+        except OSError:
+            continue
+        sock.setblocking(False)
+        return sock, raw
+    return None, None
+
+class GatewayChecker:
+    """Параллельная проверка шлюзов (Mikrotik) без запуска процесса ping на каждый адрес.
+
+    Используется один ICMP-сокет на все адреса. Если ICMP недоступен или шлюз
+    не ответил на ICMP (например, его фильтрует firewall), проверяется
+    TCP-подключение к служебным портам (отказ в подключении тоже означает,
+    что узел отвечает). Имена узлов разрешаются в адреса заранее.
+    """
+
+    def __init__(self, count=3, timeout=1.0, interval=0.2, tcp_ports=(8291, 80, 22)):
+        self.count = count
+        self.timeout = timeout
+        self.interval = interval
+        self.tcp_ports = tcp_ports
+
+    async def check(self, ips):
+        """Проверяем адреса и возвращаем {ip: GatewayStatus}."""
+        ips = list(dict.fromkeys(ip for ip in ips if ip))
+        if not ips:
+            return {}
+        addresses = await self.resolve(ips)
+        statuses = {ip: GatewayStatus(ip, "dns") for ip in ips if ip not in addresses}
+        sock, raw = open_icmp_socket()
+        if sock is None:
+            statuses.update(await self.check_tcp(addresses))
+            return statuses
+        try:
+            statuses.update(await self.check_icmp(sock, raw, addresses))
+        finally:
+            sock.close()
+        silent = {ip: address for ip, address in addresses.items() if not statuses[ip].up}
+        if silent:
+            for ip, status in (await self.check_tcp(silent)).items():
+                if not status.up:
+                    status.method = "icmp+tcp"
+                statuses[ip] = status
+        return statuses
+
+    async def resolve(self, ips):
+        """Разрешаем имена в IPv4-адреса: {ip или имя: адрес}; неразрешённые не попадают."""
+        loop = asyncio.get_running_loop()
+
+        async def lookup(ip):
+            try:
+                infos = await loop.getaddrinfo(ip, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            except (OSError, UnicodeError):
+                return None
+            return infos[0][4][0] if infos else None
+
+        resolved = await asyncio.gather(*(lookup(ip) for ip in ips))
+        return {ip: address for ip, address in zip(ips, resolved) if address}
+
+    async def check_icmp(self, sock, raw, addresses):
+        """ICMP-проверка {ip или имя: адрес}; ответы сопоставляются по адресу."""
+        loop = asyncio.get_running_loop()
+        statuses = {ip: GatewayStatus(ip, "icmp") for ip in addresses}
+        ident = os.getpid() & 0xFFFF
+        sequence = itertools.count(1)
+        pending = {}  # seq -> (ip или имя, адрес, время отправки)
+
+        def on_readable():
+            while True:
+                try:
+                    data, (address, _) = sock.recvfrom(2048)
+                except (BlockingIOError, InterruptedError):
+                    return
+                except OSError:
+                    return
+                if raw:
+                    data = data[(data[0] & 0x0F) * 4:]  # пропускаем IP-заголовок
+                if len(data) < 8:
+                    continue
+                kind, _, _, reply_ident, seq = struct.unpack("!BBHHH", data[:8])
+                # Для непривилегированного сокета идентификатор назначает ядро
+                if kind != ICMP_ECHO_REPLY or (raw and reply_ident != ident):
+                    continue
+                sent = pending.pop(seq, None)
+                if sent and sent[1] == address:
+                    statuses[sent[0]].rtts.append(time.monotonic() - sent[2])
+
+        loop.add_reader(sock.fileno(), on_readable)
+        try:
+            for _ in range(self.count):
+                for ip, address in addresses.items():
+                    seq = next(sequence) & 0xFFFF
+                    try:
+                        sock.sendto(echo_request(ident, seq), (address, 0))
+                    except OSError:
+                        continue
+                    pending[seq] = (ip, address, time.monotonic())
+                    statuses[ip].sent += 1
+                await asyncio.sleep(self.interval)
+            deadline = time.monotonic() + self.timeout
+            while pending and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+        finally:
+            loop.remove_reader(sock.fileno())
+        for status in statuses.values():
+            status.sent = max(status.sent, self.count)
+        return statuses
+
+    async def tcp_probe(self, ip):
+        """Одна TCP-попытка: время до подключения или отказа, None при таймауте."""
+        started = time.monotonic()
+        for port in self.tcp_ports:
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), self.timeout)
+                writer.close()
+                return time.monotonic() - started
+            except ConnectionRefusedError:
+                return time.monotonic() - started
+            except (OSError, asyncio.TimeoutError):
+                continue
+        return None
+
+    async def check_tcp(self, addresses):
+        """TCP-проверка {ip или имя: адрес}."""
+        statuses = {ip: GatewayStatus(ip, "tcp") for ip in addresses}
+
+        async def probe(ip):
+            for _ in range(self.count):
+                rtt = await self.tcp_probe(addresses[ip])
+                statuses[ip].sent += 1
+                if rtt is not None:
+                    statuses[ip].rtts.append(rtt)
+                    return  # узел отвечает, дальнейшие попытки не нужны
+
+        await asyncio.gather(*(probe(ip) for ip in addresses))
+        return statuses
+
+async def check_containers(containers, checker=None):
+    """Проверяем шлюзы контейнеров {название: данные из data.json}.
+
+    Возвращаем {название: GatewayStatus}; контейнеры без mikrotik_ip не попадают в результат.
+    """
+    checker = checker or GatewayChecker()
+    gateways = {name: data.get('mikrotik_ip') for name, data in containers.items() if data.get('mikrotik_ip')}
+    statuses = await checker.check(gateways.values())
+    return {name: statuses[ip] for name, ip in gateways.items() if ip in statuses}
@@ -0,0 +1,44 @@
+# src/pipeline.py
+import asyncio
+import queue
+import time
+
+class ResultQueue:
+    """Ограниченная очередь результатов между потоками сканирования и главным циклом Tk.
+
+    Производители блокируются (или ждут в цикле событий), пока очередь заполнена,
+    а главный цикл забирает результаты пакетами с ограничением по времени.
+    """
+
+    def __init__(self, maxsize=5000):
+        self.queue = queue.Queue(maxsize)
+
+    def put(self, ip, values, timeout=None):
+        """Кладём результат из обычного потока, ожидая свободного места."""
+        self.queue.put((ip, values), timeout=timeout)
+
+    async def put_async(self, ip, values, poll=0.01):
+        """Кладём результат из цикла событий asyncio, не блокируя его."""
+        while True:
+            try:
+                self.queue.put_nowait((ip, values))
+                return
+            except queue.Full:
+                await asyncio.sleep(poll)
+
+    def drain(self, max_items=500, budget=0.008):
+        """Забираем до max_items результатов, тратя не больше budget секунд."""
+        items = []
+        deadline = time.monotonic() + budget
+        while len(items) < max_items and time.monotonic() < deadline:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def empty(self):
+        return self.queue.empty()
+
+    def qsize(self):
+        return self.queue.qsize()
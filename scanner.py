@@ -0,0 +1,253 @@
+# src/scanner.py
+import asyncio
+import threading
+import time
+
+from ant import COLUMNS, build_values
+from cgminer import PORT, BASE_COMMANDS, QUERY_ERRORS, CommandRejected, ResponseReader, build_request, fetch_plan, parse_replies
+from metrics import Metrics
+from sweep import LivenessSweep
+from timeouts import TimeoutPolicy
+
+class RateLimiter:
+    """Ограничитель частоты запросов по принципу token bucket."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Резервируем токен и ждём, если запас исчерпан."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+class AsyncScanner:
+    """Асинхронный сканер аппаратов с ограничением параллелизма и частоты запросов."""
+
+    def __init__(self, concurrency=512, timeout=2.0, host_rate=None, subnet_rate=None, port=PORT,
+                 extra_commands=(), retries=2, timeouts=None, metrics=None):
+        self.concurrency = concurrency
+        self.timeout = timeout  # таймаут, пока для подсети не набралось замеров задержки
+        self.timeouts = timeouts or TimeoutPolicy(connect_timeout=timeout, response_timeout=timeout, retries=retries)
+        self.host_rate = host_rate  # запросов в секунду на один аппарат
+        self.subnet_rate = subnet_rate  # запросов в секунду на подсеть /24
+        self.port = port
+        self.host_limiters = {}
+        self.subnet_limiters = {}
+        self.commands = BASE_COMMANDS + tuple(extra_commands)
+        self.multi_unsupported = set()  # IP аппаратов, прошивка которых не принимает "stats+pools"
+        self.errors = {}  # IP -> последняя ошибка опроса (сетевая или ResponseError)
+        self.metrics = metrics or Metrics()
+        self.stop_event = threading.Event()
+
+    async def limit(self, ip, limiter=None):
+        """Соблюдаем ограничения частоты для аппарата, его подсети и общий limiter вызывающего."""
+        if limiter is not None:
+            await limiter.acquire()
+        if self.subnet_rate:
+            subnet = ip.rsplit('.', 1)[0]
+            limiter = self.subnet_limiters.get(subnet)
+            if limiter is None:
+                limiter = self.subnet_limiters[subnet] = RateLimiter(self.subnet_rate)
+            await limiter.acquire()
+        if self.host_rate:
+            limiter = self.host_limiters.get(ip)
+            if limiter is None:
+                limiter = self.host_limiters[ip] = RateLimiter(self.host_rate)
+            await limiter.acquire()
+
+    async def query(self, ip, command, limiter=None):
+        """Отправляем команду (или несколько через '+') и возвращаем {команда: ответ}.
+
+        Временные ошибки повторяются по политике таймаутов; каждая повторённая
+        попытка учитывается в miner_errors_total.
+        """
+        return await self.timeouts.call(ip, lambda attempt: self.query_once(ip, command, attempt, limiter),
+                                        lambda exc: self.metrics.record_error(ip, exc, counted=False))
+
+    async def query_once(self, ip, command, attempt=0, limiter=None):
+        """Одна попытка запроса с таймаутами по задержкам подсети."""
+        await self.limit(ip, limiter)
+        timeouts = self.timeouts
+        started = time.monotonic()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, self.port),
+                                                timeouts.connect_timeout(ip, attempt))
+        connected = time.monotonic()
+        timeouts.record_connect(ip, connected - started)
+        self.metrics.observe("miner_connect_seconds", ip, connected - started)
+        try:
+            writer.write(build_request(command))
+            await writer.drain()
+            response = await asyncio.wait_for(self.read_response(reader), timeouts.response_timeout(ip, attempt))
+        finally:
+            writer.close()
+        received = time.monotonic()
+        self.metrics.observe("miner_response_seconds", ip, received - connected)
+        self.metrics.observe("miner_response_bytes", ip, response.length)
+        replies = parse_replies(response, command)
+        self.metrics.observe("miner_parse_seconds", ip, time.monotonic() - received)
+        timeouts.record_response(ip, received - connected)
+        return replies
+
+    async def read_response(self, reader):
+        """Читаем ответ до NUL или закрытия соединения."""
+        response = ResponseReader()
+        while not response.terminated:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            response.feed(chunk)
+        return response
+
+    async def fetch(self, ip, commands, limiter=None):
+        """Запрашиваем несколько команд за одно соединение, при отказе прошивки — по отдельности."""
+        plan = fetch_plan(commands, ip not in self.multi_unsupported)
+        request = next(plan)
+        while True:
+            try:
+                result = await self.query(ip, request, limiter)
+            except QUERY_ERRORS as exc:
+                result = exc
+                if isinstance(exc, CommandRejected) and isinstance(request, tuple):
+                    self.multi_unsupported.add(ip)
+            try:
+                request = plan.send(result)
+            except StopIteration as stop:
+                replies, errors = stop.value
+                break
+        for exc in errors:
+            self.metrics.record_error(ip, exc, counted=False)
+        return replies
+
+    async def scan_miner(self, ip, progress=True, limiter=None):
+        """Сканируем аппарат и возвращаем строку таблицы или None.
+
+        progress=False — опрос не относится к текущему сканированию (мониторинг)
+        и не меняет его прогресс, только счётчики. limiter (RateLimiter) — общий
+        лимит вызывающего, которому подчиняется каждое подключение, включая повторы.
+        """
+        try:
+            replies = await self.fetch(ip, self.commands, limiter)
+        except QUERY_ERRORS as exc:
+            self.errors[ip] = exc
+            self.metrics.record_error(ip, exc, progress=progress)
+            return None
+        self.errors.pop(ip, None)
+        self.metrics.polled(ip, replies, progress)
+        return build_values(ip, replies["stats"], replies["pools"])
+
+    async def emit(self, on_result, ip, values):
+        """Передаём результат; асинхронный on_result (например, ResultQueue.put_async) дожидаемся."""
+        result = on_result(ip, values)
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def scan(self, ips, on_result, stop_event=None):
+        """Сканируем адреса пулом из concurrency воркеров, передавая результаты по мере поступления."""
+        self.metrics.start_scan(len(ips) if hasattr(ips, "__len__") else 0)
+        ips = iter(ips)
+        stop_event = stop_event or threading.Event()
+
+        async def worker():
+            for ip in ips:
+                if stop_event.is_set():
+                    return
+                values = await self.scan_miner(ip)
+                if values is not None:
+                    await self.emit(on_result, ip, values)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            self.metrics.finish_scan()
+
+    async def scan_ranges(self, ranges, on_result, stop_event=None, sweep=None, discovery=None, full=False):
+        """Сканируем диапазоны {метка: адреса или IpRange}: сначала быстрый поиск открытого порта,
+        затем полный опрос только живых адресов. Возвращаем статистику по диапазонам.
+
+        С кэшем обнаружения (DiscoveryCache) известные аппараты проверяются первыми,
+        а давно пустые адреса пропускаются; full=True — проверить все адреса.
+        """
+        sweep = sweep or LivenessSweep(port=self.port, timeouts=self.timeouts)
+        stop_event = stop_event or threading.Event()
+        live = asyncio.Queue(maxsize=self.concurrency * 2)
+        skipped = {}
+        total = sum(len(ips) for ips in ranges.values() if hasattr(ips, "__len__"))
+        if discovery is not None:
+            ranges, skipped = discovery.plan(ranges, full)
+        self.metrics.start_scan(total - sum(skipped.values()))
+        type_index = COLUMNS.index("Type")
+
+        def on_probe(ip, ok):
+            self.metrics.probed(ip, ok)
+            if discovery is not None:
+                discovery.probed(ip, ok)
+
+        async def feed():
+            try:
+                _, stats = await sweep.run(ranges, on_alive=live.put, stop_event=stop_event, on_probe=on_probe)
+            finally:
+                for _ in range(self.concurrency):
+                    await live.put(None)
+            return stats
+
+        async def worker():
+            while True:
+                ip = await live.get()
+                if ip is None:
+                    return
+                if stop_event.is_set():
+                    continue
+                values = await self.scan_miner(ip)
+                if values is not None:
+                    if discovery is not None:
+                        discovery.found(ip, values[type_index])
+                    await self.emit(on_result, ip, values)
+
+        try:
+            stats, *_ = await asyncio.gather(feed(), *(worker() for _ in range(self.concurrency)))
+        finally:
+            self.metrics.finish_scan()
+            if discovery is not None:
+                discovery.save()
+        for label, count in skipped.items():
+            stats[label].skipped = count
+        return stats
+
+    def run(self, ips, on_result, on_done=None):
+        """Запускаем сканирование списка адресов в фоновом потоке."""
+        return self.start_thread(lambda stop_event: self.scan(ips, on_result, stop_event), on_done)
+
+    def run_ranges(self, ranges, on_result, on_done=None):
+        """Запускаем сканирование диапазонов с предварительным опросом в фоновом потоке.
+
+        on_done получает статистику по диапазонам (None при ошибке).
+        """
+        return self.start_thread(lambda stop_event: self.scan_ranges(ranges, on_result, stop_event), on_done)
+
+    def start_thread(self, make_coro, on_done=None):
+        """Запускаем корутину в фоновом потоке со своим циклом событий."""
+        # У каждого запуска своё событие остановки, чтобы stop() не задевал следующий запуск
+        stop_event = self.stop_event = threading.Event()
+
+        def target():
+            result = None
+            try:
+                result = asyncio.run(make_coro(stop_event))
+            finally:
+                if on_done:
+                    on_done(result)
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Останавливаем сканирование после завершения текущих запросов."""
+        self.stop_event.set()
@@ -0,0 +1,173 @@
+# src/sharded.py
+import asyncio
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from array import array
+from multiprocessing.connection import wait
+
+from ant import COLUMNS
+from iprange import IpRange, int_to_ip, ip_to_int
+from scanner import AsyncScanner
+from sweep import RangeStats
+
+# Запись результата: IP (uint32), затем остальные значения строки в порядке COLUMNS.
+# Значения передаются в исходном виде (как их вернул аппарат), чтобы результат
+# не зависел от числа процессов: тег типа (1 байт), затем
+#   s — строка с длиной (uint16), i — int64, f — double, t/F — True/False, n — None
+IP = struct.Struct("!I")
+LENGTH = struct.Struct("!H")
+INT = struct.Struct("!q")
+FLOAT = struct.Struct("!d")
+FLUSH_BYTES = 64 * 1024
+FLUSH_INTERVAL = 0.1
+
+def encode_value(value, parts):
+    if value is None:
+        parts.append(b"n")
+    elif isinstance(value, bool):
+        parts.append(b"t" if value else b"F")
+    elif isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        parts.append(b"i" + INT.pack(value))
+    elif isinstance(value, float):
+        parts.append(b"f" + FLOAT.pack(value))
+    else:
+        data = str(value).encode("utf-8")
+        if len(data) > 0xFFFF:
+            # Обрезаем по границе символа, иначе decode_records упадёт на половине многобайтного символа
+            data = data[:0xFFFF].decode("utf-8", "ignore").encode("utf-8")
+        parts.append(b"s" + LENGTH.pack(len(data)))
+        parts.append(data)
+
+def encode_record(ip, values):
+    """Упаковываем строку таблицы в компактный двоичный вид."""
+    parts = [IP.pack(ip_to_int(ip))]
+    for value in values[1:]:
+        encode_value(value, parts)
+    return b"".join(parts)
+
+def decode_records(data):
+    """Распаковываем пакет записей в пары (ip, значения в порядке COLUMNS)."""
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        (ip,) = IP.unpack_from(view, offset)
+        offset += IP.size
+        values = [int_to_ip(ip)]
+        for _ in range(len(COLUMNS) - 1):
+            tag = view[offset]
+            offset += 1
+            if tag == ord("s"):
+                (length,) = LENGTH.unpack_from(view, offset)
+                offset += LENGTH.size
+                values.append(bytes(view[offset:offset + length]).decode("utf-8"))
+                offset += length
+            elif tag == ord("i"):
+                values.append(INT.unpack_from(view, offset)[0])
+                offset += INT.size
+            elif tag == ord("f"):
+                values.append(FLOAT.unpack_from(view, offset)[0])
+                offset += FLOAT.size
+            else:
+                values.append({ord("t"): True, ord("F"): False}.get(tag))
+        yield values[0], values
+
+def shard_ranges(ranges, shards):
+    """Делим диапазоны {метка: адреса или IpRange} между процессами по подсетям /24.
+
+    Адреса одной подсети попадают в один процесс, чтобы ограничения
+    частоты на подсеть работали внутри одного процесса.
+    """
+    result = [{} for _ in range(shards)]
+    for label, ips in ranges.items():
+        for value in ips if isinstance(ips, IpRange) else map(ip_to_int, ips):
+            shard = result[(value >> 8) % shards]
+            if label not in shard:
+                shard[label] = array('I')
+            shard[label].append(value)
+    return result
+
+def worker_main(conn, ranges, options, stop_event):
+    """Процесс-воркер: свой цикл событий, результаты отправляются пакетами через pipe."""
+    scanner = AsyncScanner(**options)
+    buffer = bytearray()
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal last_flush
+        if buffer:
+            conn.send_bytes(buffer)
+            buffer.clear()
+        last_flush = time.monotonic()
+
+    def on_result(ip, values):
+        buffer.extend(encode_record(ip, values))
+        if len(buffer) >= FLUSH_BYTES or time.monotonic() - last_flush >= FLUSH_INTERVAL:
+            flush()
+
+    ranges = {label: (int_to_ip(value) for value in values) for label, values in ranges.items()}
+    stats = asyncio.run(scanner.scan_ranges(ranges, on_result, stop_event))
+    flush()
+    conn.send_bytes(b"")
+    conn.send([(label, s.probed, s.alive, s.elapsed) for label, s in stats.items()])
+    conn.close()
+
+class ShardedScanner:
+    """Сканирование большого числа адресов несколькими процессами.
+
+    Каждый процесс получает свою часть подсетей и запускает AsyncScanner
+    со своим циклом событий; результаты возвращаются в компактном двоичном
+    виде и передаются в on_result в родительском процессе.
+    """
+
+    def __init__(self, processes=None, **options):
+        self.processes = processes or os.cpu_count() or 1
+        self.options = options  # параметры AsyncScanner для каждого процесса
+        self.context = multiprocessing.get_context("spawn")
+        self.stop_event = self.context.Event()
+
+    def scan_ranges(self, ranges, on_result):
+        """Сканируем диапазоны и возвращаем объединённую статистику по ним."""
+        self.stop_event.clear()
+        workers = []
+        readers = {}
+        for shard in shard_ranges(ranges, self.processes):
+            if not shard:
+                continue
+            reader, writer = self.context.Pipe(duplex=False)
+            process = self.context.Process(target=worker_main, args=(writer, shard, self.options, self.stop_event),
+                                           daemon=True)
+            process.start()
+            writer.close()
+            workers.append(process)
+            readers[reader] = process
+
+        stats = {label: RangeStats(label) for label in ranges}
+        while readers:
+            for reader in wait(list(readers)):
+                try:
+                    data = reader.recv_bytes()
+                    if data:
+                        for ip, values in decode_records(data):
+                            on_result(ip, values)
+                        continue
+                    for label, probed, alive, elapsed in reader.recv():
+                        stats[label].probed += probed
+                        stats[label].alive += alive
+                        stats[label].elapsed += elapsed
+                except EOFError:
+                    # Процесс завершился аварийно: его оставшиеся результаты потеряны
+                    process = readers[reader]
+                    process.join(1)
+                    print(f"Процесс сканирования {process.pid} завершился с кодом {process.exitcode}, "
+                          f"часть результатов потеряна", file=sys.stderr)
+                reader.close()
+                del readers[reader]
+        for process in workers:
+            process.join()
+        return stats
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,91 @@
+# src/sweep.py
+import asyncio
+import threading
+import time
+
+from cgminer import PORT
+from iprange import IpRange
+from timeouts import TimeoutPolicy
+
+class RangeStats:
+    """Статистика предварительного опроса одного IP-диапазона."""
+
+    def __init__(self, label):
+        self.label = label
+        self.probed = 0
+        self.alive = 0
+        self.elapsed = 0.0  # суммарное время ожидания подключений, с
+        self.skipped = 0  # адреса, пропущенные по кэшу обнаружения
+
+    @property
+    def hit_rate(self):
+        return self.alive / self.probed if self.probed else 0.0
+
+    def __repr__(self):
+        skipped = f", пропущено {self.skipped}" if self.skipped else ""
+        return f"{self.label}: {self.alive}/{self.probed} ({self.hit_rate:.0%}), {self.elapsed:.1f} с{skipped}"
+
+class LivenessSweep:
+    """Быстрый поиск адресов с открытым портом API перед полноценным опросом.
+
+    Таймаут подключения берётся из политики таймаутов (задержки живых
+    аппаратов той же подсети или контейнера) и ограничивается
+    min_timeout..max_timeout; до первых замеров используется timeout.
+    Повторов нет: для пустого адреса повтор только удвоил бы время обхода.
+    """
+
+    def __init__(self, concurrency=2048, timeout=0.5, min_timeout=0.05, max_timeout=1.5,
+                 margin=3.0, port=PORT, timeouts=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.port = port
+        self.timeouts = timeouts or TimeoutPolicy(connect_timeout=timeout, min_connect=min_timeout,
+                                                  max_connect=max_timeout, margin=margin)
+
+    def probe_timeout(self, ip):
+        timeout = self.timeouts.connect_timeout(ip, default=self.timeout)
+        return min(self.max_timeout, max(self.min_timeout, timeout))
+
+    async def probe(self, ip):
+        """Проверяем, принимает ли адрес подключения на порт API."""
+        started = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, self.port), self.probe_timeout(ip))
+        except (OSError, asyncio.TimeoutError):
+            return False, time.monotonic() - started
+        rtt = time.monotonic() - started
+        writer.close()
+        self.timeouts.record_connect(ip, rtt)
+        return True, rtt
+
+    async def run(self, ranges, on_alive=None, stop_event=None, on_probe=None):
+        """Опрашиваем диапазоны {метка: адреса или IpRange} и возвращаем (живые адреса, статистика по диапазонам).
+
+        on_probe(ip, ok) вызывается после каждой проверки.
+        """
+        stop_event = stop_event or threading.Event()
+        stats = {label: RangeStats(label) for label in ranges}
+        targets = ((label, ip) for label, ips in ranges.items()
+                   for ip in (ips.addresses() if isinstance(ips, IpRange) else ips))
+        alive = []
+
+        async def worker():
+            for label, ip in targets:
+                if stop_event.is_set():
+                    return
+                ok, elapsed = await self.probe(ip)
+                range_stats = stats[label]
+                range_stats.probed += 1
+                range_stats.elapsed += elapsed
+                if on_probe:
+                    on_probe(ip, ok)
+                if ok:
+                    range_stats.alive += 1
+                    alive.append(ip)
+                    if on_alive:
+                        await on_alive(ip)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return alive, stats
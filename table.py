@@ -0,0 +1,321 @@
+# src/table.py
+import math
+import tkinter as tk
+from array import array
+from tkinter import ttk
+
+from ant import COLUMNS, NUMERIC_COLUMNS, parse_float
+
+def ip_key(value):
+    """Числовой ключ сортировки IP-адреса."""
+    try:
+        a, b, c, d = map(int, value.split('.'))
+    except ValueError:
+        return math.nan
+    return float((a << 24) | (b << 16) | (c << 8) | d)
+
+def number_key(value):
+    number = parse_float(value)
+    return math.nan if number is None else number
+
+class TableModel:
+    """Колоночная модель таблицы результатов, ключ строки — IP.
+
+    Значения хранятся по столбцам; для IP и числовых столбцов дополнительно
+    хранятся числа, по которым выполняется сортировка. Отсортированные
+    индексы кэшируются по столбцам и сбрасываются только при изменении данных.
+    """
+
+    def __init__(self, columns=COLUMNS, numeric_columns=NUMERIC_COLUMNS):
+        self.columns = tuple(columns)
+        self.keys = []  # IP по номеру строки
+        self.cells = [[] for _ in self.columns]  # строковые значения по столбцам
+        self.numbers = {}  # номер столбца -> array('d') с ключами сортировки
+        self.converters = {}
+        for col, name in enumerate(self.columns):
+            if name == "IP":
+                self.converters[col] = ip_key
+            elif name in numeric_columns:
+                self.converters[col] = number_key
+        for col in self.converters:
+            self.numbers[col] = array('d')
+        self.haystack = []  # строка строки в нижнем регистре для поиска
+        self.index = {}  # IP -> номер строки
+        self.sort_column = None
+        self.descending = False
+        self.filter_text = ""
+        self.sorted_cache = {}
+        self.view_cache = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, ip):
+        return ip in self.index
+
+    def invalidate(self, col=None):
+        """Сбрасываем кэш сортировки столбца (или всех столбцов) и текущее представление."""
+        if col is None:
+            self.sorted_cache.clear()
+        else:
+            self.sorted_cache.pop(col, None)
+        self.view_cache = None
+
+    def upsert(self, ip, values):
+        """Добавляем или обновляем строку; возвращаем True, если что-то изменилось."""
+        values = [str(value) for value in values]
+        row = self.index.get(ip)
+        if row is None:
+            self.index[ip] = len(self.keys)
+            self.keys.append(ip)
+            for col, value in enumerate(values):
+                self.cells[col].append(value)
+                if col in self.converters:
+                    self.numbers[col].append(self.converters[col](value))
+            self.haystack.append(" ".join(values).lower())
+            self.invalidate()
+            return True
+
+        changed = False
+        for col, value in enumerate(values):
+            if self.cells[col][row] != value:
+                self.cells[col][row] = value
+                if col in self.converters:
+                    self.numbers[col][row] = self.converters[col](value)
+                self.invalidate(col)
+                changed = True
+        if changed:
+            self.haystack[row] = " ".join(values).lower()
+        return changed
+
+    def remove(self, ips):
+        """Удаляем строки; на место удалённой переносится последняя строка."""
+        removed = 0
+        for ip in ips:
+            row = self.index.pop(ip, None)
+            if row is None:
+                continue
+            last = len(self.keys) - 1
+            columns = self.cells + list(self.numbers.values()) + [self.haystack, self.keys]
+            if row != last:
+                for column in columns:
+                    column[row] = column[last]
+                self.index[self.keys[row]] = row
+            for column in columns:
+                column.pop()
+            removed += 1
+        if removed:
+            self.invalidate()
+        return removed
+
+    def clear(self):
+        self.remove(list(self.keys))
+
+    def row(self, row):
+        """Значения строки по её номеру."""
+        return [column[row] for column in self.cells]
+
+    def rows(self):
+        """Все строки в порядке текущего представления."""
+        return [self.row(row) for row in self.view()]
+
+    def snapshot(self):
+        """Копия текущего представления для чтения из другого потока: (число строк, итератор строк).
+
+        Копируются только списки ссылок на значения, строки собираются при чтении.
+        """
+        order = list(self.view())
+        cells = [list(column) for column in self.cells]
+        return len(order), ([column[row] for column in cells] for row in order)
+
+    def sorted_rows(self, col):
+        """Номера строк, отсортированные по возрастанию столбца, и число непустых значений.
+
+        Строки без числового значения идут в конце списка.
+        """
+        cached = self.sorted_cache.get(col)
+        if cached is None:
+            if col in self.numbers:
+                keys = self.numbers[col]
+                order = [row for row in range(len(keys)) if keys[row] == keys[row]]
+                order.sort(key=keys.__getitem__)
+                valid = len(order)
+                order.extend(row for row in range(len(keys)) if keys[row] != keys[row])
+            else:
+                keys = self.cells[col]
+                order = sorted(range(len(keys)), key=keys.__getitem__)
+                valid = len(order)
+            cached = self.sorted_cache[col] = (order, valid)
+        return cached
+
+    def sort(self, name, descending=False):
+        self.sort_column = self.columns.index(name)
+        self.descending = descending
+        self.view_cache = None
+
+    def set_filter(self, text):
+        text = text.strip().lower()
+        if text != self.filter_text:
+            self.filter_text = text
+            self.view_cache = None
+
+    def view(self):
+        """Номера строк с учётом фильтра и сортировки."""
+        if self.view_cache is None:
+            if self.sort_column is None:
+                order = range(len(self.keys))
+            else:
+                order, valid = self.sorted_rows(self.sort_column)
+                if self.descending:
+                    order = order[valid - 1::-1] + order[valid:] if valid else order
+            if self.filter_text:
+                haystack = self.haystack
+                text = self.filter_text
+                order = [row for row in order if text in haystack[row]]
+            self.view_cache = list(order)
+        return self.view_cache
+
+class VirtualTable:
+    """Таблица, в которой создаются только видимые строки Treeview.
+
+    Данные живут в TableModel; при прокрутке меняются значения фиксированного
+    набора элементов Treeview, а не сами элементы.
+    """
+
+    def __init__(self, parent, model, rowheight=20, heading_height=24):
+        self.model = model
+        try:
+            rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or rowheight)
+        except (tk.TclError, ValueError):
+            pass
+        self.rowheight = rowheight
+        self.heading_height = heading_height
+        self.offset = 0
+        self.items = []  # элементы Treeview, переиспользуемые под видимые строки
+        self.shown = []  # (IP, значения), отображаемые в каждом элементе
+        self.selected = set()  # IP выбранных строк
+        self.rendering = False
+        self.refresh_scheduled = False
+
+        self.frame = tk.Frame(parent)
+        self.scroll_y = tk.Scrollbar(self.frame, orient="vertical", command=self.on_scroll)
+        self.scroll_y.pack(side="right", fill="y")
+        self.scroll_x = tk.Scrollbar(self.frame, orient="horizontal")
+        self.scroll_x.pack(side="bottom", fill="x")
+
+        self.tree = ttk.Treeview(self.frame, columns=model.columns, show="headings", style="Treeview",
+                                 xscrollcommand=self.scroll_x.set, selectmode="extended")
+        self.tree.pack(fill="both", expand=True)
+        self.scroll_x.config(command=self.tree.xview)
+
+        for name in model.columns:
+            self.tree.heading(name, text=name, command=lambda _name=name: self.sort_by(_name, False))
+            self.tree.column(name, width=100)
+
+        self.tree.bind("<Configure>", lambda e: self.render())
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_rows(-1 if e.delta > 0 else 1, 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_rows(-1, 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_rows(1, 3))
+        self.tree.bind("<Prior>", lambda e: self.scroll_rows(-1, self.visible_count()))
+        self.tree.bind("<Next>", lambda e: self.scroll_rows(1, self.visible_count()))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def bind(self, sequence, callback):
+        self.tree.bind(sequence, callback)
+
+    def visible_count(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            height = int(self.tree.cget("height")) * self.rowheight + self.heading_height
+        return max(1, (height - self.heading_height) // self.rowheight)
+
+    def schedule_refresh(self, delay=100):
+        """Перерисовать таблицу не чаще одного раза за delay мс."""
+        if not self.refresh_scheduled:
+            self.refresh_scheduled = True
+            self.tree.after(delay, self.refresh)
+
+    def refresh(self):
+        self.refresh_scheduled = False
+        self.render()
+
+    def render(self):
+        """Показываем строки модели, попадающие в видимую область."""
+        view = self.model.view()
+        total = len(view)
+        count = min(self.visible_count(), total)
+        self.offset = max(0, min(self.offset, total - count))
+
+        while len(self.items) < count:
+            self.items.append(self.tree.insert("", "end"))
+            self.shown.append(None)
+        if len(self.items) > count:
+            self.tree.delete(*self.items[count:])
+            del self.items[count:]
+            del self.shown[count:]
+
+        self.rendering = True
+        try:
+            selection = []
+            for position, item in enumerate(self.items):
+                row = view[self.offset + position]
+                ip = self.model.keys[row]
+                values = self.model.row(row)
+                if self.shown[position] != (ip, values):
+                    self.tree.item(item, values=values)
+                    self.shown[position] = (ip, values)
+                if ip in self.selected:
+                    selection.append(item)
+            self.tree.selection_set(selection)
+        finally:
+            self.rendering = False
+
+        if total:
+            self.scroll_y.set(self.offset / total, (self.offset + count) / total)
+        else:
+            self.scroll_y.set(0, 1)
+
+    def on_select(self, event):
+        """Переносим выбор видимых строк в набор выбранных IP."""
+        if self.rendering:
+            return
+        visible = {shown[0] for shown in self.shown if shown}
+        chosen = set(self.tree.selection())
+        selected = {shown[0] for item, shown in zip(self.items, self.shown) if item in chosen}
+        self.selected = (self.selected - visible) | selected
+
+    def on_scroll(self, *args):
+        """Обработчик вертикальной полосы прокрутки."""
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.model.view()))
+            self.render()
+        elif args[0] == "scroll":
+            step = self.visible_count() if args[2] == "pages" else 1
+            self.scroll_rows(int(args[1]), step)
+
+    def scroll_rows(self, direction, step):
+        self.offset += direction * step
+        self.render()
+        return "break"
+
+    def sort_by(self, name, descending):
+        """Сортировка по столбцу выполняется в модели."""
+        self.model.sort(name, descending)
+        self.offset = 0
+        self.render()
+        self.tree.heading(name, command=lambda: self.sort_by(name, not descending))
+
+    def set_filter(self, text):
+        self.model.set_filter(text)
+        self.offset = 0
+        self.render()
+
+    def selected_values(self):
+        """Значения выбранных строк в порядке отображения."""
+        if not self.selected:
+            return []
+        keys = self.model.keys
+        return [self.model.row(row) for row in self.model.view() if keys[row] in self.selected]
@@ -0,0 +1,106 @@
+# src/tests/test_cgminer.py
+import json
+import random
+
+import pytest
+
+from ant import build_values
+from cgminer import (CommandRejected, EmptyResponse, MalformedResponse, ResponseReader, TruncatedResponse,
+                     fetch_plan, parse_replies)
+from farm import FarmOptions, build_reply
+
+IP = "127.42.0.1"
+
+def reader_for(data, chunk=7):
+    """Ответ, прочитанный фрагментами, как из сокета."""
+    reader = ResponseReader(size=16)
+    for start in range(0, len(data), chunk):
+        reader.feed(data[start:start + chunk])
+    return reader
+
+def reply_bytes(command, multi=True):
+    reply = build_reply(IP, command, FarmOptions(multi=multi), random.Random(1))
+    return json.dumps(reply).encode()
+
+def test_multi_reply():
+    replies = parse_replies(reader_for(reply_bytes("stats+pools") + b"\0"), ("stats", "pools"))
+    values = build_values(IP, replies["stats"], replies["pools"])
+    assert values[1] == "Antminer S19"
+    assert float(values[2]) > 0
+    assert values[6] == "stratum+tcp://btc.pool-a.com:3333"
+
+def test_missing_comma_between_stats_objects():
+    data = reply_bytes("stats").replace(b"}, {", b"}{", 1) + b"\0"
+    replies = parse_replies(reader_for(data), "stats")
+    assert len(replies["stats"]["STATS"]) == 2
+
+def test_multibyte_characters_split_between_chunks():
+    data = json.dumps({"STATUS": [{"STATUS": "S"}], "POOLS": [{"URL": "пул"}]}, ensure_ascii=False).encode() + b"\0"
+    replies = parse_replies(reader_for(data, chunk=3), "pools")
+    assert replies["pools"]["POOLS"][0]["URL"] == "пул"
+
+def test_data_after_nul_is_ignored():
+    reader = reader_for(reply_bytes("pools") + b"\0garbage")
+    assert reader.terminated
+    assert parse_replies(reader, "pools")["pools"]["POOLS"]
+
+def test_corrupted_reply_is_malformed():
+    data = reply_bytes("stats+pools")
+    middle = data.index(b', "', len(data) // 2) + 1  # между полями, а не внутри строки
+    data = data[:middle] + b"#garbage" + data[middle:] + b"\0"
+    with pytest.raises(MalformedResponse):
+        parse_replies(reader_for(data), ("stats", "pools"))
+
+def test_corrupted_number_is_malformed():
+    data = reply_bytes("stats").replace(b'"Elapsed": ', b'"Elapsed": 1300 0 ', 1) + b"\0"
+    with pytest.raises(MalformedResponse):
+        parse_replies(reader_for(data), "stats")
+
+def test_truncated_reply():
+    data = reply_bytes("stats")
+    with pytest.raises(TruncatedResponse):
+        parse_replies(reader_for(data[:len(data) // 2]), "stats")
+
+def test_empty_reply():
+    with pytest.raises(EmptyResponse):
+        parse_replies(ResponseReader(), "stats")
+
+def test_rejected_multi_command():
+    data = reply_bytes("stats+pools", multi=False) + b"\0"
+    with pytest.raises(CommandRejected):
+        parse_replies(reader_for(data), ("stats", "pools"))
+
+def run_plan(commands, answer, multi=True):
+    """Проводим fetch_plan, отвечая answer(запрос) (ответ или исключение); (ответы, ошибки, запросы)."""
+    plan = fetch_plan(commands, multi)
+    requests = [next(plan)]
+    while True:
+        try:
+            requests.append(plan.send(answer(requests[-1])))
+        except StopIteration as stop:
+            return stop.value + (requests,)
+
+def test_plan_falls_back_to_single_commands():
+    def answer(request):
+        if isinstance(request, tuple):
+            return CommandRejected("составная команда не поддерживается")
+        return {request: {}}
+    replies, errors, requests = run_plan(("stats", "pools"), answer)
+    assert set(replies) == {"stats", "pools"}
+    assert requests == [("stats", "pools"), "stats", "pools"]
+    assert errors == []
+
+def test_plan_tolerates_network_error_on_extra_command():
+    def answer(request):
+        if request == "devs":
+            return ConnectionResetError()
+        return {"stats": {}, "pools": {}} if isinstance(request, tuple) else {request: {}}
+    replies, errors, requests = run_plan(("stats", "pools", "devs"), answer)
+    assert set(replies) == {"stats", "pools"}
+    assert isinstance(errors[0], ConnectionResetError)
+
+def test_plan_raises_on_table_command_error():
+    def answer(request):
+        return TimeoutError() if request == "pools" else {request: {}}
+    with pytest.raises(TimeoutError):
+        run_plan(("stats", "pools"), answer, multi=False)
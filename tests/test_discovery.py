@@ -0,0 +1,30 @@
+# src/tests/test_discovery.py
+from discovery import DiscoveryCache
+from iprange import compile_spec
+
+def plan(cache, now):
+    planned, skipped = cache.plan({"r": compile_spec("10.0.0.1-10.0.0.4")}, now=now)
+    return list(planned["r"]), skipped["r"]
+
+def test_known_miners_first_and_empty_addresses_back_off(tmp_path):
+    cache = DiscoveryCache(str(tmp_path / "discovery.db"), base_interval=600)
+    cache.probed("10.0.0.1", False, now=1000)
+    cache.found("10.0.0.3", "Antminer S19", now=1000)
+    assert plan(cache, 1100) == (["10.0.0.3", "10.0.0.2", "10.0.0.4"], 1)
+    assert plan(cache, 1600)[1] == 0
+    cache.probed("10.0.0.1", False, now=1600)
+    assert plan(cache, 2700)[1] == 1  # после второй неудачи интервал удваивается
+    assert plan(cache, 2800)[1] == 0
+
+def test_open_port_without_reply_is_not_skipped(tmp_path):
+    cache = DiscoveryCache(str(tmp_path / "discovery.db"))
+    cache.probed("10.0.0.2", True, now=1000)  # порт открыт, но опрос не удался
+    assert plan(cache, 1100) == (["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4"], 0)
+
+def test_cache_is_saved(tmp_path):
+    path = str(tmp_path / "discovery.db")
+    cache = DiscoveryCache(path)
+    cache.found("10.0.0.4", "Antminer S9", now=1000)
+    cache.probed("10.0.0.1", False, now=1000)
+    assert cache.save() == 2
+    assert DiscoveryCache(path).summary() == (1, 1)
@@ -0,0 +1,64 @@
+# src/tests/test_iprange.py
+import pytest
+
+from iprange import ContainerRanges, IpRange, RangeSpecError, compile_container, compile_spec, ip_to_int
+
+def test_spec_forms():
+    assert len(compile_spec("10.4.0.0/24")) == 254
+    assert len(compile_spec("10.4.101.10-10.4.102.20")) == 246 + 21
+    assert len(compile_spec("10.4.101-103.1-200")) == 600
+    assert len(compile_spec("10.4.101.*")) == 256
+    assert len(compile_spec("10.4.101")) == 255
+    assert len(compile_spec("10.4")) == 256 * 255
+
+def test_exclusion_inside_spec():
+    ip_range = compile_spec("10.4.101, !10.4.101.1 !10.4.101.200-10.4.101.255")
+    assert len(ip_range) == 198
+    assert "10.4.101.1" not in ip_range
+    assert "10.4.101.2" in ip_range
+
+def test_overlapping_terms_are_merged():
+    ip_range = compile_spec("10.0.0.1-10.0.0.10; 10.0.0.5-10.0.0.20")
+    assert ip_range == IpRange([(ip_to_int("10.0.0.1"), ip_to_int("10.0.0.20"))])
+    assert list(ip_range.addresses())[-1] == "10.0.0.20"
+
+@pytest.mark.parametrize("spec", ["", "!10.0.0.1", "10.0.0.300", "10.0.0.9-10.0.0.1", "10.0.0.1 !10.0.0.1", "fe80::/64"])
+def test_invalid_specs(spec):
+    with pytest.raises(RangeSpecError):
+        compile_spec(spec)
+
+def test_exclusion_applies_to_whole_container():
+    compiled = compile_container(["10.4.101", "!10.4.101.1", "10.4.102.1-10.4.102.9 !10.4.102.5"])
+    assert set(compiled) == {"10.4.101", "10.4.102.1-10.4.102.9 !10.4.102.5"}
+    assert "10.4.101.1" not in compiled["10.4.101"]
+    assert len(compiled["10.4.102.1-10.4.102.9 !10.4.102.5"]) == 8
+
+def test_container_without_addresses():
+    with pytest.raises(RangeSpecError):
+        compile_container(["!10.4.101.1"])
+    errors = []
+    assert compile_container(["10.4.101.1", "!10.4.101.1", "bad"], lambda spec, exc: errors.append(spec)) == {}
+    assert errors == ["bad", "10.4.101.1"]
+
+def test_shared_addresses_belong_to_first_container():
+    ranges = ContainerRanges({
+        "a": {"ip_ranges": ["10.0.0.0/16"]},
+        "b": {"ip_ranges": ["10.0.5.0-10.1.0.3", "192.168.1.*", "!192.168.1.7"]},
+    })
+    assert ranges.container_of("10.0.5.15") == "a"
+    assert ranges.container_of("10.0.255.255") == "b"  # широковещательный адрес /16 не входит в сеть a
+    assert ranges.container_of("10.1.0.3") == "b"
+    assert ranges.container_of("10.1.0.4") is None
+    assert ranges.container_of("192.168.1.7") is None
+    assert ranges.container_of("не адрес") is None
+    assert len(ranges.ranges(["b"])["b 10.0.5.0-10.1.0.3"]) == 5
+    assert dict(ranges.items())["192.168.1.200"] == "b"
+
+def test_invalid_specs_are_collected_not_printed(capsys):
+    ranges = ContainerRanges({"a": {"ip_ranges": ["bad-spec", "10.0.0.1-10.0.0.5"]}, "b": {"ip_ranges": ["10.0.1.1"]}})
+    assert list(ranges.errors) == ["a"]
+    assert "bad-spec" in ranges.errors["a"][0]
+    assert len(ranges.ranges(["a"])["a 10.0.0.1-10.0.0.5"]) == 5
+    assert capsys.readouterr().out == ""
+    ranges.update({"a": {"ip_ranges": ["10.0.0.1-10.0.0.5"]}})
+    assert ranges.errors == {}
@@ -0,0 +1,13 @@
+# src/tests/test_sharded.py
+from sharded import decode_records, encode_record
+
+def test_values_keep_their_types():
+    values = ["10.0.0.1", "Antminer S19", "92359.19", 11729.55, "", None, "stratum+tcp://pool:3333", True, 12345]
+    assert list(decode_records(encode_record(values[0], values))) == [("10.0.0.1", values)]
+
+def test_long_string_is_cut_on_character_boundary():
+    values = ["10.0.0.2", "Ж" * 40000] + [""] * 7
+    (ip, decoded), = decode_records(encode_record(values[0], values))
+    assert ip == "10.0.0.2"
+    assert decoded[1] == "Ж" * 32767
+    assert decoded[2:] == values[2:]
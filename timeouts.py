@@ -0,0 +1,210 @@
+# src/timeouts.py
+import asyncio
+import collections
+import random
+import threading
+import time
+
+from cgminer import EmptyResponse, TruncatedResponse
+
+# Ошибки, после которых имеет смысл повторить запрос: аппарат жив, но занят
+# (например, переинициализирует хешплаты и долго отдаёт stats)
+TRANSIENT_ERRORS = (asyncio.TimeoutError, TimeoutError, ConnectionResetError, ConnectionAbortedError,
+                    EmptyResponse, TruncatedResponse)
+
+class LatencyWindow:
+    """Скользящее окно задержек с кэшем процентилей.
+
+    Процентили пересчитываются не чаще одного раза на recompute новых
+    замеров, чтобы расчёт таймаута не сортировал окно на каждый запрос.
+    """
+
+    def __init__(self, size=256, recompute=16):
+        self.samples = collections.deque(maxlen=size)
+        self.recompute = recompute
+        self.added = 0
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, value):
+        self.samples.append(value)
+        self.added += 1
+        if self.added < self.recompute or self.added % self.recompute == 0:
+            self.cache.clear()
+
+    def percentile(self, p):
+        value = self.cache.get(p)
+        if value is None:
+            ordered = sorted(self.samples)
+            value = self.cache[p] = ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+        return value
+
+class ScopeStats:
+    """Задержки и исходы запросов одной области: подсети, контейнера или всех адресов."""
+
+    def __init__(self):
+        self.connect = LatencyWindow()
+        self.response = LatencyWindow()
+        self.successes = 0
+        self.timeouts = 0
+        self.errors = 0  # прочие временные ошибки: сброс соединения, пустой или обрезанный ответ
+        self.retries = 0
+
+class TimeoutPolicy:
+    """Таймауты подключения и ответа по наблюдаемым задержкам и повтор временных ошибок.
+
+    Задержки собираются по подсетям /24, контейнерам (если задан container_of)
+    и по всем адресам. Таймаут берётся из самой узкой области, в которой
+    набралось min_samples замеров: percentile задержки, умноженный на margin.
+    При повторе таймаут удваивается, перед повтором — пауза со случайным
+    разбросом (full jitter), чтобы занятые аппараты не получали запросы залпом.
+    """
+
+    def __init__(self, connect_timeout=2.0, response_timeout=2.0, min_connect=0.1, max_connect=3.0,
+                 min_response=0.5, max_response=10.0, percentile=99, margin=3.0, min_samples=20,
+                 retries=2, backoff=0.1, max_backoff=2.0, container_of=None):
+        self.default_connect = connect_timeout
+        self.default_response = response_timeout
+        self.min_connect = min_connect
+        self.max_connect = max_connect
+        self.min_response = min_response
+        self.max_response = max_response
+        self.percentile = percentile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.container_of = container_of  # callable: IP -> контейнер или None
+        self.stats = {}  # (вид области, ключ) -> ScopeStats
+        self.lock = threading.Lock()  # Ant обращается к политике из многих потоков
+
+    def scopes(self, ip):
+        """Области адреса от самой узкой к самой широкой."""
+        scopes = [("subnet", ip.rsplit('.', 1)[0])]
+        container = self.container_of(ip) if self.container_of else None
+        if container is not None:
+            scopes.append(("container", container))
+        scopes.append(("all", ""))
+        return scopes
+
+    def learned(self, ip, kind):
+        """Таймаут по задержкам kind ("connect" или "response") или None, если замеров мало."""
+        with self.lock:
+            for scope in self.scopes(ip):
+                stats = self.stats.get(scope)
+                window = getattr(stats, kind) if stats else None
+                if window is not None and len(window) >= self.min_samples:
+                    return window.percentile(self.percentile) * self.margin
+        return None
+
+    def connect_timeout(self, ip, attempt=0, default=None):
+        timeout = self.learned(ip, "connect")
+        if timeout is None:
+            timeout = self.default_connect if default is None else default
+        timeout = max(self.min_connect, timeout)
+        return min(self.max_connect, timeout * 2 ** attempt)
+
+    def response_timeout(self, ip, attempt=0):
+        timeout = self.learned(ip, "response")
+        if timeout is None:
+            timeout = self.default_response
+        timeout = max(self.min_response, timeout)
+        return min(self.max_response, timeout * 2 ** attempt)
+
+    def update(self, ip, action):
+        with self.lock:
+            for scope in self.scopes(ip):
+                stats = self.stats.get(scope)
+                if stats is None:
+                    stats = self.stats[scope] = ScopeStats()
+                action(stats)
+
+    def record_connect(self, ip, seconds):
+        self.update(ip, lambda stats: stats.connect.add(seconds))
+
+    def record_response(self, ip, seconds):
+        def action(stats):
+            stats.response.add(seconds)
+            stats.successes += 1
+        self.update(ip, action)
+
+    def record_failure(self, ip, exc, retried):
+        def action(stats):
+            if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+                stats.timeouts += 1
+            else:
+                stats.errors += 1
+            if retried:
+                stats.retries += 1
+        self.update(ip, action)
+
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def call(self, ip, attempt_call, on_retry=None):
+        """Выполняем attempt_call(номер попытки) с повтором временных ошибок.
+
+        on_retry(исключение) вызывается для каждой неудачной попытки, которая будет
+        повторена; ошибка последней попытки поднимается вызывающему.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return await attempt_call(attempt)
+            except TRANSIENT_ERRORS as exc:
+                retry = attempt < self.retries
+                self.record_failure(ip, exc, retry)
+                if not retry:
+                    raise
+                if on_retry is not None:
+                    on_retry(exc)
+            await asyncio.sleep(self.backoff_delay(attempt))
+
+    def call_sync(self, ip, attempt_call, on_retry=None):
+        """То же, что call, для синхронного кода (Ant)."""
+        for attempt in range(self.retries + 1):
+            try:
+                return attempt_call(attempt)
+            except TRANSIENT_ERRORS as exc:
+                retry = attempt < self.retries
+                self.record_failure(ip, exc, retry)
+                if not retry:
+                    raise
+                if on_retry is not None:
+                    on_retry(exc)
+            time.sleep(self.backoff_delay(attempt))
+
+    def summary(self, kinds=("all", "container", "subnet")):
+        """Статистика по областям: [(вид, ключ, {показатель: значение})]."""
+        rows = []
+        with self.lock:
+            for (kind, key), stats in sorted(self.stats.items()):
+                if kind not in kinds:
+                    continue
+                row = {
+                    "successes": stats.successes,
+                    "timeouts": stats.timeouts,
+                    "errors": stats.errors,
+                    "retries": stats.retries,
+                }
+                for name in ("connect", "response"):
+                    window = getattr(stats, name)
+                    for p in (50, 99):
+                        row[f"{name}_p{p}"] = window.percentile(p) if len(window) else None
+                rows.append((kind, key, row))
+        return rows
+
+    def report(self, kinds=("all", "container")):
+        """Текстовая сводка задержек и текущих таймаутов."""
+        def ms(value):
+            return "-" if value is None else f"{value * 1000:.0f}"
+
+        lines = []
+        for kind, key, row in self.summary(kinds):
+            lines.append(f"{key or 'все адреса'}: подключение p50/p99 {ms(row['connect_p50'])}/{ms(row['connect_p99'])} мс, "
+                         f"ответ p50/p99 {ms(row['response_p50'])}/{ms(row['response_p99'])} мс, "
+                         f"успешно {row['successes']}, таймаутов {row['timeouts']}, "
+                         f"ошибок {row['errors']}, повторов {row['retries']}")
+        return "\n".join(lines)
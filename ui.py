@@ -1,16 +1,17 @@
 # src/ui.py
 import tkinter as tk
-from tkinter import ttk, Toplevel, filedialog, Menu
+from tkinter import Toplevel, Menu
 from ttkbootstrap import Style
-import csv
-import pandas as pd
 import webbrowser
+from ant import COLUMNS
+from table import TableModel, VirtualTable
 
 class UI:
     def __init__(self, root, callbacks):
         self.root = root
         self.callbacks = callbacks
         self.style = Style(theme="litera")
+        self.model = TableModel()
 
         self.setup_menu()
         self.setup_container_frame()
@@ -22,6 +23,8 @@ class UI:
         self.menu_bar = Menu(self.root)
         self.create_file_menu()
         self.create_theme_menu()
+        self.create_monitor_menu()
+        self.create_analytics_menu()
         self.root.config(menu=self.menu_bar)
 
     def create_file_menu(self):
@@ -29,6 +32,8 @@ class UI:
         file_menu = Menu(self.menu_bar, tearoff=0)
         file_menu.add_command(label="Экспорт в CSV", command=self.callbacks['export_to_csv'])
         file_menu.add_command(label="Экспорт в XLSX", command=self.callbacks['export_to_xlsx'])
+        file_menu.add_command(label="Экспорт в Parquet", command=self.callbacks['export_to_parquet'])
+        file_menu.add_command(label="Экспорт истории за неделю", command=self.callbacks['export_history'])
         self.menu_bar.add_cascade(label="Файл", menu=file_menu)
 
     def create_theme_menu(self):
@@ -38,6 +43,21 @@ class UI:
         theme_menu.add_command(label="Темная", command=lambda: self.change_theme("darkly"))
         self.menu_bar.add_cascade(label="Тема", menu=theme_menu)
 
+    def create_monitor_menu(self):
+        """Создание меню режима мониторинга."""
+        monitor_menu = Menu(self.menu_bar, tearoff=0)
+        monitor_menu.add_command(label="Запустить", command=self.callbacks['start_monitoring'])
+        monitor_menu.add_command(label="Остановить", command=self.callbacks['stop_monitoring'])
+        self.menu_bar.add_cascade(label="Мониторинг", menu=monitor_menu)
+
+    def create_analytics_menu(self):
+        """Создание меню аналитики по ферме."""
+        analytics_menu = Menu(self.menu_bar, tearoff=0)
+        analytics_menu.add_command(label="Сводка по сканированию", command=self.callbacks['show_analytics'])
+        analytics_menu.add_command(label="Сводка за сутки", command=self.callbacks['show_history_analytics'])
+        analytics_menu.add_command(label="Метрики сканирования", command=self.callbacks['show_scan_metrics'])
+        self.menu_bar.add_cascade(label="Аналитика", menu=analytics_menu)
+
     def setup_container_frame(self):
         """Настройка фрейма управления контейнерами."""
         self.container_frame = tk.Frame(self.root)
@@ -59,37 +79,30 @@ class UI:
         self.scan_button = tk.Button(self.container_frame, text="Scan", command=self.callbacks['scan_selected_containers'])
         self.scan_button.pack(side="bottom", pady=10)
 
+        # Без отметки давно пустые адреса пропускаются по кэшу обнаружения
+        self.full_discovery = tk.BooleanVar(value=False)
+        self.full_discovery_check = tk.Checkbutton(self.container_frame, text="Полное обнаружение",
+                                                   variable=self.full_discovery)
+        self.full_discovery_check.pack(side="bottom")
+
     def setup_tree_frame(self):
         """Настройка фрейма с таблицей для отображения данных сканирования."""
-        columns = ("IP", "Type", "GHS av", "GHS 5s", "total_freqavg", "miner_version", "Pool", "User", "Elapsed")
-        self.tree_frame = tk.Frame(self.root)
-        self.tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
-
-        self.tree_scroll_y = tk.Scrollbar(self.tree_frame, orient="vertical")
-        self.tree_scroll_y.pack(side="right", fill="y")
-
-        self.tree_scroll_x = tk.Scrollbar(self.tree_frame, orient="horizontal")
-        self.tree_scroll_x.pack(side="bottom", fill="x")
+        self.table = VirtualTable(self.root, self.model)
+        self.table.pack(fill="both", expand=True, padx=10, pady=10)
+        self.tree = self.table.tree
 
-        self.tree = ttk.Treeview(self.tree_frame, columns=columns, show="headings", style="Treeview",
-                                 yscrollcommand=self.tree_scroll_y.set, xscrollcommand=self.tree_scroll_x.set)
-        self.tree.pack(fill="both", expand=True)
-
-        self.tree_scroll_y.config(command=self.tree.yview)
-        self.tree_scroll_x.config(command=self.tree.xview)
-
-        for col in columns:
-            self.tree.heading(col, text=col, command=lambda _col=col: self.sort_by(_col, False))
-            self.tree.column(col, width=100)
-
-        self.tree.bind("<Double-1>", self.callbacks['on_double_click'])
-        self.tree.bind("<Control-c>", self.callbacks['copy_selection'])
-        self.tree.bind("<Button-3>", self.callbacks['show_context_menu'])
+        self.table.bind("<Double-1>", self.callbacks['on_double_click'])
+        self.table.bind("<Control-c>", self.callbacks['copy_selection'])
+        self.table.bind("<Button-3>", self.callbacks['show_context_menu'])
 
     def setup_status_label(self):
         """Настройка метки статуса в нижней части окна."""
         self.status_label = tk.Label(self.root, text="В сети: 0")
         self.status_label.pack(side="bottom", fill="x")
+        self.progress_label = tk.Label(self.root, text="")
+        self.progress_label.pack(side="bottom", fill="x")
+        self.scan_progress_label = tk.Label(self.root, text="", anchor="w")
+        self.scan_progress_label.pack(side="bottom", fill="x")
 
     def change_theme(self, theme_name):
         """Смена темы приложения."""
@@ -129,6 +142,19 @@ class UI:
             self.callbacks['save_container'](container_name, ip_ranges, mikrotik_ip)
         self.add_container_window.destroy()
 
+    def show_text_window(self, title, text):
+        """Открыть окно с текстом (моноширинный шрифт, с прокруткой)."""
+        window = Toplevel(self.root)
+        window.title(title)
+        window.geometry("1000x600")
+        scroll = tk.Scrollbar(window, orient="vertical")
+        scroll.pack(side="right", fill="y")
+        text_widget = tk.Text(window, wrap="none", font=("Courier", 10), yscrollcommand=scroll.set)
+        text_widget.insert("1.0", text)
+        text_widget.config(state="disabled")
+        text_widget.pack(fill="both", expand=True)
+        scroll.config(command=text_widget.yview)
+
     def update_container_status(self, container_name, status):
         """Обновить статус контейнера в списке."""
         try:
@@ -137,57 +163,44 @@ class UI:
         except ValueError:
             pass  # Обработка случая, когда container_name не найден
 
-    def update_tree(self, ip, data):
-        """Обновить таблицу данными."""
-        stats_data = data.get("stats", {}).get("STATS", [{}])
-        pools_data = data.get("pools", {}).get("POOLS", [{}])
-
-        stat = stats_data[0] if len(stats_data) > 0 else {}
-        stat_s = stats_data[1] if len(stats_data) > 1 else {}
-        pool_one = pools_data[0] if len(pools_data) > 0 else {}
-        pool_two = pools_data[1] if len(pools_data) > 1 else {}
-        pool_three = pools_data[2] if len(pools_data) > 2 else {}
-
-        values = [
-            ip,
-            stat.get("Type", ""),
-            stat_s.get("GHS av", ""),
-            stat_s.get("GHS 5s", ""),
-            stat_s.get("total_freqavg", ""),
-            stat_s.get("miner_version", ""),
-            pool_one.get("URL", ""),
-            pool_two.get("User", ""),
-            stat_s.get("Elapsed", "")
-        ]
-
-        self.tree.insert("", "end", values=values)
+    def update_tree(self, ip, values, delay=100):
+        """Обновить таблицу данными.
+
+        Данные сразу попадают в модель, а перерисовка видимых строк откладывается.
+        """
+        if self.model.upsert(ip, values):
+            self.table.schedule_refresh(delay)
+
+    def flush_tree(self):
+        """Отрисовать накопленные изменения."""
+        self.table.refresh()
         self.update_scan_count()
 
+    def remove_rows(self, ips):
+        """Удалить строки аппаратов, которые больше не отвечают."""
+        if self.model.remove(ips):
+            self.flush_tree()
+
     def clear_tree(self):
         """Очистить таблицу."""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.model.clear()
+        self.table.selected.clear()
+        self.flush_tree()
 
     def sort_by(self, col, descending):
         """Сортировка таблицы по указанному столбцу."""
-        data = [(self.tree.set(child, col), child) for child in self.tree.get_children()]
-        data.sort(reverse=descending)
-
-        for index, item in enumerate(data):
-            self.tree.move(item[1], '', index)
-
-        self.tree.heading(col, command=lambda: self.sort_by(col, not descending))
+        self.table.sort_by(col, descending)
 
     def on_double_click(self, event):
         """Открытие веб-страницы при двойном клике."""
-        item = self.tree.selection()[0]
-        url = self.tree.item(item, 'values')[6]
+        selected = self.table.selected_values()
+        url = selected[0][COLUMNS.index("Pool")] if selected else ""
         if url:
             webbrowser.open(url)
 
     def copy_selection(self, event):
         """Копирование выбранных строк в буфер обмена."""
-        selected_items = [self.tree.item(item, 'values') for item in self.tree.selection()]
+        selected_items = self.table.selected_values()
         if selected_items:
             clipboard_data = "\n".join([",".join(map(str, item)) for item in selected_items])
             self.root.clipboard_clear()
@@ -199,7 +212,15 @@ class UI:
         context_menu.add_command(label="Копировать", command=lambda: self.copy_selection(event))
         context_menu.post(event.x_root, event.y_root)
 
+    def set_progress(self, text):
+        """Показать состояние фоновой операции (экспорт) под таблицей."""
+        self.progress_label.config(text=text)
+
+    def set_scan_progress(self, text):
+        """Показать ход сканирования: проверено адресов, найдено, ошибки, оставшееся время."""
+        if self.scan_progress_label.cget("text") != text:
+            self.scan_progress_label.config(text=text)
+
     def update_scan_count(self):
-        """Обновить количество контейнеров в статусе."""
-        count = len(self.container_listbox.get(0, "end"))
-        self.status_label.config(text=f"В сети: {count}")
+        """Обновить количество аппаратов в сети в статусе."""
+        self.status_label.config(text=f"В сети: {len(self.model)}")